@@ -1,84 +1,104 @@
 #!/usr/bin/env python
 
+from collections import OrderedDict
 import cStringIO
 import datetime
 import json
 from mimetypes import guess_type
+import os
+import shutil
 import urllib
 
 from  csvkit.unicsv import  UnicodeCSVDictWriter
 import envoy
-from flask import Flask, Markup, abort, render_template, url_for
+from flask import Flask, Markup, Response, abort, render_template, url_for
 from peewee import fn
 
 import app_config
 import copytext
-from models import Expenditure, Legislator, Lobbyist, Organization
+from models import CategoryMonth, Dataset, Expenditure, Legislator, LegislatorMonth, LobbyistMonth, Organization, OrganizationMonth, RankIndex, database
 from render_utils import flatten_app_config, make_context
 
 app = Flask(app_config.PROJECT_NAME)
 
-def get_ago():
-    """
-    Generate a datetime that will include 24 reporting periods
-    for which we have data.
-    """
-    most_recent = Expenditure.select().order_by(Expenditure.report_period.desc()).limit(1)[0].report_period
+# The loaded dataset's metadata and the database file's mtime when it was read
+dataset_cache = {}
 
-    # Get the previous month. If previous month is December, set to 12. 
-    month = most_recent.month + 1
-    if month > 12: 
-        month = 12
+# Rank indexes by (dataset version, window start)
+rank_indexes = {}
 
-    ago = datetime.date(most_recent.year - 2, month, 1)
+# Rows written between each chunk of a streamed CSV
+CSV_CHUNK_ROWS = 1000
 
-    return ago
+# CSV slices kept open at once while writing downloads
+CSV_MAX_OPEN_FILES = 256
 
-@app.route('/')
-def index():
+def get_dataset():
     """
-    Example view demonstrating rendering a simple HTML page.
+    Metadata about the loaded dataset. It is read once per process and
+    again whenever the database file changes, e.g. after a load.
+    Anything cached from the data should be keyed on its version.
     """
-    context = make_context()
+    mtime = os.path.getmtime(database.database)
 
-    ago = get_ago()
+    if dataset_cache.get('mtime') != mtime:
+        dataset_cache['mtime'] = mtime
+        dataset_cache['dataset'] = Dataset.get()
 
-    expenditures = Expenditure.select().where(Expenditure.report_period >= ago)
-    organizations = Organization.select().join(Expenditure).where(Expenditure.report_period >= ago).distinct()
-    lobbyists = Lobbyist.select().join(Expenditure).where(Expenditure.report_period >= ago).distinct()
-    legislators = Legislator.select().join(Expenditure).where(Expenditure.report_period >= ago).distinct()
+    return dataset_cache['dataset']
 
-    for legislator in legislators:
-        legislator.total_spending = legislator.expenditures.where(Expenditure.report_period >= ago).aggregate(fn.Sum(Expenditure.cost))
+def get_ranks(ago):
+    """
+    Spending ranks since ago, built once per dataset version.
+    """
+    key = (get_dataset().version, ago)
 
-    legislators_total_spending = sorted(legislators, key=lambda l: l.total_spending, reverse=True)[:10]
-    
-    categories_total_spending = {}
+    if key not in rank_indexes:
+        rank_indexes.clear()
+        rank_indexes[key] = RankIndex(ago)
 
-    for org in organizations:
-        org.total_spending = org.expenditures.where(Expenditure.report_period >= ago).aggregate(fn.Sum(Expenditure.cost))
+    return rank_indexes[key]
 
-        if not org.total_spending:
-            continue
+def homepage_stats(ago, limit=10):
+    """
+    Homepage totals, counts, top legislators and organizations and
+    category totals since ago, from five grouped rollup queries no
+    matter how many entities there are.
+    """
+    total_spending, total_expenditures, total_organizations = OrganizationMonth.select(
+        fn.Sum(OrganizationMonth.total),
+        fn.Sum(OrganizationMonth.count),
+        fn.Count(fn.Distinct(OrganizationMonth.organization))
+    ).where(OrganizationMonth.month >= ago).tuples()[0]
+
+    total_lobbyists = LobbyistMonth.select(fn.Count(fn.Distinct(LobbyistMonth.lobbyist))).where(LobbyistMonth.month >= ago).scalar()
+
+    categories = CategoryMonth.totals(ago).order_by(fn.Sum(CategoryMonth.total).desc()).tuples()
+
+    return {
+        'total_spending': total_spending or 0,
+        'total_expenditures': total_expenditures or 0,
+        'total_organizations': total_organizations,
+        'total_lobbyists': total_lobbyists,
+        'legislators_total_spending': list(LegislatorMonth.ranked(ago).limit(limit)),
+        'organizations_total_spending': list(OrganizationMonth.ranked(ago).limit(limit)),
+        'categories_total_spending': [(category, spending) for category, spending, count in categories]
+    }
 
-        if org.category in categories_total_spending:
-            categories_total_spending[org.category] += org.total_spending
-        else:
-            categories_total_spending[org.category] = org.total_spending
+@app.route('/')
+def index():
+    """
+    Example view demonstrating rendering a simple HTML page.
+    """
+    context = make_context()
+
+    ago = get_dataset().window_start
 
-    organizations_total_spending = sorted(organizations, key=lambda o: o.total_spending, reverse=True)[:10]
-    categories_total_spending = sorted(categories_total_spending.items(), key=lambda c: c[1], reverse=True)
+    context.update(homepage_stats(ago))
 
     context['senators'] = Legislator.select().where(Legislator.office == 'Senator')
     context['representatives'] = Legislator.select().where(Legislator.office == 'Representative')
-    context['expenditures'] = expenditures
-    context['total_spending'] = expenditures.aggregate(fn.Sum(Expenditure.cost)) 
-    context['total_expenditures'] = expenditures.count()
-    context['total_organizations'] = organizations.count()
-    context['total_lobbyists'] = lobbyists.count()
-    context['organizations_total_spending'] = organizations_total_spending
-    context['legislators_total_spending'] = legislators_total_spending
-    context['categories_total_spending'] = categories_total_spending
+    context['expenditures'] = Expenditure.select().where(Expenditure.report_period >= ago)
 
     return render_template('index.html', **context)
 
@@ -117,65 +137,193 @@ def methodology():
 
     return render_template('methodology.html', **context)
 
-@app.route('/download/lobbyingmissouri.csv')
-def download_csv():
+CSV_FIELDS = [
+    'lobbyist_first_name',
+    'lobbyist_last_name',
+    'report_period',
+    'recipient_name',
+    'recipient_type',
+    'legislator_first_name',
+    'legislator_last_name',
+    'legislator_office',
+    'legislator_party',
+    'legislator_district',
+    'event_date',
+    'category',
+    'description',
+    'cost',
+    'organization_name',
+    'organization_industry',
+    'group',
+    'ethics_board_id',
+    'is_solicitation'
+]
+
+def csv_row(ex):
     """
-    Generate a data download.
+    The download row for an expenditure read with select_related().
+    """
+    return {
+        'lobbyist_first_name': ex.lobbyist.first_name,
+        'lobbyist_last_name': ex.lobbyist.last_name,
+        'report_period': ex.report_period,
+        'recipient_name': ex.recipient,
+        'recipient_type': ex.recipient_type,
+        'legislator_first_name': ex.legislator.first_name if ex.legislator else None,
+        'legislator_last_name': ex.legislator.last_name if ex.legislator else None,
+        'legislator_office': ex.legislator.office if ex.legislator else None,
+        'legislator_party': ex.legislator.party if ex.legislator else None,
+        'legislator_district': ex.legislator.district if ex.legislator else None,
+        'event_date': ex.event_date,
+        'category': ex.category,
+        'description': ex.description,
+        'cost': ex.cost,
+        'organization_name': ex.organization.name,
+        'organization_industry': ex.organization.category,
+        'group': ex.group.name if ex.group else None,
+        'ethics_board_id': ex.ethics_id,
+        'is_solicitation': ex.is_solicitation
+    }
+
+def year_download_url(year):
+    return '/download/years/lobbyingmissouri-%i.csv' % year
+
+def generate_csv(expenditures):
+    """
+    Yield a CSV of expenditures in UTF-8 chunks of CSV_CHUNK_ROWS rows,
+    reading them from a single joined query without caching them.
     """
     f = cStringIO.StringIO()
 
-    writer = UnicodeCSVDictWriter(f, [
-        'lobbyist_first_name',
-        'lobbyist_last_name',
-        'report_period',
-        'recipient_name',
-        'recipient_type',
-        'legislator_first_name',
-        'legislator_last_name',
-        'legislator_office',
-        'legislator_party',
-        'legislator_district',
-        'event_date',
-        'category',
-        'description',
-        'cost',
-        'organization_name',
-        'organization_industry',
-        'group',
-        'ethics_board_id',
-        'is_solicitation'
-    ])
-
+    writer = UnicodeCSVDictWriter(f, CSV_FIELDS)
     writer.writeheader()
 
-    expenditures = Expenditure.select()
-
-    for ex in expenditures:
-        row = {
-            'lobbyist_first_name': ex.lobbyist.first_name,
-            'lobbyist_last_name': ex.lobbyist.last_name,
-            'report_period': ex.report_period,
-            'recipient_name': ex.recipient,
-            'recipient_type': ex.recipient_type,
-            'legislator_first_name': ex.legislator.first_name if ex.legislator else None,
-            'legislator_last_name': ex.legislator.last_name if ex.legislator else None,
-            'legislator_office': ex.legislator.office if ex.legislator else None,
-            'legislator_party': ex.legislator.party if ex.legislator else None,
-            'legislator_district': ex.legislator.district if ex.legislator else None,
-            'event_date': ex.event_date,
-            'category': ex.category,
-            'description': ex.description,
-            'cost': ex.cost,
-            'organization_name': ex.organization.name,
-            'organization_industry': ex.organization.category,
-            'group': ex.group.name if ex.group else None,
-            'ethics_board_id': ex.ethics_id,
-            'is_solicitation': ex.is_solicitation
-        }
+    yield f.getvalue()
+
+    f.seek(0)
+    f.truncate()
+
+    for i, ex in enumerate(expenditures.iterator(), 1):
+        writer.writerow(csv_row(ex))
+
+        if i % CSV_CHUNK_ROWS == 0:
+            yield f.getvalue()
+
+            f.seek(0)
+            f.truncate()
+
+    yield f.getvalue()
+
+class CSVFiles(object):
+    """
+    Appends rows to many CSV files under a root directory, keeping at
+    most max_open of them open and closing the least recently used.
+    """
+    def __init__(self, root, max_open=CSV_MAX_OPEN_FILES):
+        self.root = root
+        self.max_open = max_open
+
+        self.open_files = OrderedDict()
+        self.created = set()
+
+    def writerow(self, url, row):
+        if url in self.open_files:
+            f, writer = self.open_files.pop(url)
+        else:
+            if len(self.open_files) >= self.max_open:
+                self.open_files.popitem(last=False)[1][0].close()
+
+            path = self.root + url
+            created = url not in self.created
+
+            if created:
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    pass
+
+            f = open(path, 'w' if created else 'a')
+            writer = UnicodeCSVDictWriter(f, CSV_FIELDS)
+
+            if created:
+                writer.writeheader()
+                self.created.add(url)
+
+        self.open_files[url] = (f, writer)
 
         writer.writerow(row)
 
-    return f.getvalue().decode('utf-8')
+    def close(self):
+        for f, writer in self.open_files.values():
+            f.close()
+
+        self.open_files.clear()
+
+def write_downloads(root='www', max_open=CSV_MAX_OPEN_FILES):
+    """
+    Write the full CSV download and its year, legislator and
+    organization slices. Organization and legislator slices are
+    written from passes ordered by that entity, so each file is opened
+    once however many there are. Returns the number of files written.
+    """
+    shutil.rmtree(os.path.join(root, 'download'), ignore_errors=True)
+
+    expenditures = Expenditure.select_related()
+
+    passes = [
+        (expenditures.order_by(Expenditure.id),
+            lambda ex: ['/download/lobbyingmissouri.csv', year_download_url(ex.report_period.year)]),
+        (expenditures.order_by(Expenditure.organization, Expenditure.id),
+            lambda ex: [ex.organization.download_url()]),
+        (expenditures.where(~(Expenditure.legislator >> None)).order_by(Expenditure.legislator, Expenditure.id),
+            lambda ex: [ex.legislator.download_url()])
+    ]
+
+    files = CSVFiles(root, max_open)
+
+    try:
+        for query, urls in passes:
+            for ex in query.iterator():
+                row = csv_row(ex)
+
+                for url in urls(ex):
+                    files.writerow(url, row)
+    finally:
+        files.close()
+
+    return len(files.created)
+
+@app.route('/download/lobbyingmissouri.csv')
+def download_csv():
+    """
+    Generate a data download.
+    """
+    expenditures = Expenditure.select_related().order_by(Expenditure.id)
+
+    return Response(generate_csv(expenditures), mimetype='text/csv')
+
+@app.route('/download/<string:kind>/lobbyingmissouri-<string:key>.csv')
+def _download_slice(kind, key):
+    """
+    One year, legislator or organization's slice of the data download.
+    fab render writes these with write_downloads().
+    """
+    expenditures = Expenditure.select_related().order_by(Expenditure.id)
+
+    try:
+        if kind == 'years':
+            year = int(key)
+            expenditures = expenditures.where(Expenditure.report_period >= datetime.date(year, 1, 1), Expenditure.report_period < datetime.date(year + 1, 1, 1))
+        elif kind == 'legislators':
+            expenditures = expenditures.where(Expenditure.legislator == Legislator.get(Legislator.slug == key))
+        elif kind == 'organizations':
+            expenditures = expenditures.where(Expenditure.organization == Organization.get(Organization.slug == key))
+        else:
+            abort(404)
+    except (ValueError, Legislator.DoesNotExist, Organization.DoesNotExist):
+        abort(404)
+
+    return Response(generate_csv(expenditures), mimetype='text/csv')
 
 @app.route('/sitemap.xml')
 def sitemap():
@@ -219,36 +367,14 @@ def _legislator(slug):
     """
     context = make_context()
 
-    ago = get_ago()
+    ago = get_dataset().window_start
 
-    legislators = Legislator.select()
     legislator = Legislator.get(Legislator.slug==slug)
 
-    for l in legislators:
-        l.total_spending = l.expenditures.where(Expenditure.report_period >= ago).aggregate(fn.Sum(Expenditure.cost))
-
-    legislators_total_spending = sorted(legislators, key=lambda l: l.total_spending, reverse=True)
-    
-    legislator_rank = None
-
-    for i, l in enumerate(legislators_total_spending):
-        if l.id == legislator.id:
-            legislator_rank = i + 1
-
-    org_spending = {}
-
-    for ex in legislator.expenditures:
-        if ex.organization.id in org_spending:
-            org_spending[ex.organization.id] += ex.cost
-        else:
-            org_spending[ex.organization.id] = ex.cost
-
     top_organizations = []
     top_categories = {}
 
-    for org_id, spending in org_spending.items():
-        org = Organization.get(Organization.id == org_id)
-        org.total_spending = spending
+    for org in legislator.top_organizations():
         top_organizations.append(org)
 
         if org.category in top_categories:
@@ -256,17 +382,15 @@ def _legislator(slug):
         else:
             top_categories[org.category] = org.total_spending
 
-    top_organizations = sorted(top_organizations, key=lambda o: o.total_spending, reverse=True)[:10]
+    top_organizations = top_organizations[:10]
     top_categories = sorted(top_categories.items(), key=lambda c: c[1], reverse=True)
 
     context['legislator'] = legislator
-    context['expenditures_recent'] = legislator.expenditures.where(Expenditure.report_period >= ago).order_by(Expenditure.cost.desc())
-    context['total_spending'] = sum([e.cost for e in legislator.expenditures]) 
-    context['total_spending_recent'] = sum([e.cost for e in legislator.expenditures.where(Expenditure.report_period >= ago)]) 
-    context['total_expenditures'] = legislator.expenditures.count()
-    context['total_expenditures_recent'] = legislator.expenditures.where(Expenditure.report_period >= ago).count()
+    context['expenditures_recent'] = legislator.recent_expenditures(ago)
+    context['total_spending'], context['total_expenditures'] = LegislatorMonth.spending(legislator=legislator)
+    context['total_spending_recent'], context['total_expenditures_recent'] = LegislatorMonth.spending(ago, legislator=legislator)
     context['top_organizations'] = top_organizations 
-    context['legislator_rank'] = legislator_rank
+    context['legislator_rank'] = get_ranks(ago).rank('legislator', legislator)
     context['top_categories'] = top_categories
 
     return render_template('legislator.html', **context)
@@ -278,51 +402,18 @@ def _organization(slug):
     """
     context = make_context()
 
-    ago = get_ago()
+    ago = get_dataset().window_start
     
     organization = Organization.get(Organization.slug==slug)
-    organizations = Organization.select().join(Expenditure).where(Expenditure.report_period >= ago).distinct()
-
-    for o in organizations:
-        o.total_spending = o.expenditures.where(Expenditure.report_period >= ago).aggregate(fn.Sum(Expenditure.cost))
-
-    organizations_total_spending = sorted(organizations, key=lambda o: o.total_spending, reverse=True)
-    
-    organization_rank = None
-
-    for i, o in enumerate(organizations_total_spending):
-        if o.id == organization.id:
-            organization_rank = i + 1
-
-    legislator_spending = {}
-
-    for ex in organization.expenditures:
-        # Groups or old/non-attributable expenses
-        if not ex.legislator:
-            continue
-
-        if ex.legislator.id in legislator_spending:
-            legislator_spending[ex.legislator.id] += ex.cost
-        else:
-            legislator_spending[ex.legislator.id] = ex.cost
-
-    top_legislators = []
-
-    for legislator_id, spending in legislator_spending.items():
-        legislator = Legislator.get(Legislator.id == legislator_id)
-        legislator.total_spending = spending
-        top_legislators.append(legislator)
 
-    top_legislators = sorted(top_legislators, key=lambda o: o.total_spending, reverse=True)[:10]
+    top_legislators = list(organization.top_legislators().limit(10))
 
     context['organization'] = organization
-    context['expenditures_recent'] = organization.expenditures.where(Expenditure.report_period >= ago).order_by(Expenditure.cost.desc())
-    context['total_spending'] = sum([e.cost for e in organization.expenditures]) 
-    context['total_spending_recent'] = sum([e.cost for e in organization.expenditures.where(Expenditure.report_period >= ago)]) 
-    context['total_expenditures'] = organization.expenditures.count()
-    context['total_expenditures_recent'] = organization.expenditures.where(Expenditure.report_period >= ago).count()
+    context['expenditures_recent'] = organization.recent_expenditures(ago)
+    context['total_spending'], context['total_expenditures'] = OrganizationMonth.spending(organization=organization)
+    context['total_spending_recent'], context['total_expenditures_recent'] = OrganizationMonth.spending(ago, organization=organization)
     context['top_legislators'] = top_legislators 
-    context['organization_rank'] = organization_rank
+    context['organization_rank'] = get_ranks(ago).rank('organization', organization)
 
     return render_template('organization.html', **context)
 
@@ -180,7 +180,8 @@ def render():
         rule_string = rule.rule
         name = rule.endpoint
 
-        if name == 'static' or name.startswith('_'):
+        # The full download is written with its slices below
+        if name in ['static', 'download_csv'] or name.startswith('_'):
             print 'Skipping %s' % name
             continue
 
@@ -214,6 +215,10 @@ def render():
         with open(filename, 'w') as f:
             f.write(content.encode('utf-8'))
 
+    print 'Writing downloads'
+    files = app.write_downloads('www')
+    print 'Wrote %i download files' % files
+
 def _render_slug_pages(models, view_name, output_path, compiled_includes):
     """
     Render pages for SlugModels.
@@ -253,6 +258,51 @@ def _render_slug_pages(models, view_name, output_path, compiled_includes):
 
     return compiled_includes
 
+# Views that read every expenditure by design
+FULL_SCAN_VIEWS = ['download_csv']
+
+def check_query_plans():
+    """
+    Request each page and fail if any of its queries does a full scan
+    of a large table.
+    """
+    client = app.app.test_client()
+    paths = []
+
+    for rule in app.app.url_map.iter_rules():
+        if rule.arguments or rule.endpoint.startswith('_') or rule.endpoint in ['static'] + FULL_SCAN_VIEWS:
+            continue
+
+        paths.append(rule.rule)
+
+    # The busiest detail pages
+    legislator = models.Legislator.select().join(models.Expenditure).group_by(models.Legislator).order_by(models.fn.Count(models.Expenditure.id).desc()).get()
+    organization = models.Organization.select().join(models.Expenditure).group_by(models.Organization).order_by(models.fn.Count(models.Expenditure.id).desc()).get()
+
+    paths.append(legislator.url())
+    paths.append(organization.url())
+
+    failures = []
+
+    for path in paths:
+        with models.QueryLog().capture() as log:
+            response = client.get(path)
+
+        if response.status_code != 200:
+            abort('%s returned %i' % (path, response.status_code))
+
+        for sql, params in log.queries:
+            for table in models.full_table_scans(sql, params):
+                failures.append((path, table, sql))
+
+        print '%s: %i queries' % (path, len(log.queries))
+
+    for path, table, sql in failures:
+        print 'Full scan of %s on %s: %s' % (table, path, sql)
+
+    if failures:
+        abort('%i queries do full table scans' % len(failures))
+
 def render_pages():
     """
     Render the legislator and organization pages.
@@ -399,7 +449,7 @@ def _deploy_to_s3(path='.gzip'):
 
     s3cmd = 's3cmd -P --add-header=Cache-Control:max-age=5 --guess-mime-type --recursive --exclude-from gzip_types.txt sync %s/ %s'
     s3cmd_gzip = 's3cmd -P --add-header=Cache-Control:max-age=5 --add-header=Content-encoding:gzip --guess-mime-type --recursive --exclude "*" --include-from gzip_types.txt sync %s/ %s'
-    s3cmd_download = 's3cmd -P --add-header=Cache-Control:max-age=5 --add-header=Content-encoding:gzip --add-header="Content-Disposition:attachment;filename=missouri-lobbying.csv;" --guess-mime-type --recursive sync %s/ %s'
+    s3cmd_download = 's3cmd -P --add-header=Cache-Control:max-age=5 --add-header=Content-encoding:gzip --add-header="Content-Disposition:attachment;" --guess-mime-type --recursive sync %s/ %s'
 
     for bucket in app_config.S3_BUCKETS:
         local(s3cmd % (path, 's3://%s/' % (bucket)))
@@ -564,29 +614,77 @@ def delete_tables():
     """
     models.delete_tables()
 
-def load_data(first_year=2004):
+def _truthy(value):
+    """
+    Fabric passes task arguments as strings.
+    """
+    return value in (True, 'True', 'true', '1', 'yes')
+
+def _run_loader(loader):
     """
-    Execute the data loader.
+    Run an incremental load if possible, otherwise rebuild the database
+    in bulk-load mode.
     """
+    if loader.check_incremental():
+        loader.run()
+        return
+
     delete_tables()
-    create_tables()
+    models.create_tables(indexes=False)
+
+    with models.bulk_load():
+        loader.run()
+
+def load_data(first_year=2004, batch_size=models.BULK_INSERT_BATCH_SIZE, processes=1, incremental=False, source='csv', snapshots=True):
+    """
+    Execute the data loader. Pass processes=N to parse files in parallel
+    and incremental=True to only reload files that have changed.
+    Pass source=xlsx to read the archived workbooks in data/expenditures
+    and snapshots=False to parse every file from scratch.
+    """
+    loader = models.LobbyLoader(int(first_year), int(batch_size), processes=int(processes), incremental=_truthy(incremental), source=source, snapshots=_truthy(snapshots))
+
+    _run_loader(loader)
+
+def benchmark_sources(year=2013):
+    """
+    Compare reading and parsing one year from the CSV exports and the workbooks.
+    """
+    year = int(year)
+
+    for source in ['csv', 'xlsx']:
+        loader = models.LobbyLoader(year, source=source, snapshots=False)
+
+        for expenditure_type in loader.EXPENDITURE_TYPES:
+            with loader.timer.time(expenditure_type) as stage:
+                for records in loader.parse_expenditures(year, expenditure_type):
+                    stage.rows += len(records)
+
+        print '%s %i' % (source, year)
+        loader.timer.report()
+        print ''
 
+def scrape_data(first_year=2004, refresh=False, workers=4):
+    """
+    Download MEC exports. Past years already on disk are skipped
+    unless refresh=True.
+    """
     loader = models.LobbyLoader(int(first_year))
-    loader.run()
+    loader.scrape_lobbying_data(_truthy(refresh), int(workers))
 
-def local_bootstrap(first_year=2004):
+def local_bootstrap(first_year=2004, incremental=False, refresh=False):
     """
-    Destroy and rebuild the local database.
+    Scrape new data and rebuild the local database. Pass
+    incremental=True to only reload changed files when possible and
+    refresh=True to download past years again.
     """
     update_copy()
     update_data_files()
 
-    delete_tables()
-    create_tables()
+    loader = models.LobbyLoader(int(first_year), incremental=_truthy(incremental))
+    loader.scrape_lobbying_data(_truthy(refresh))
 
-    loader = models.LobbyLoader(int(first_year))
-    loader.scrape_lobbying_data()
-    loader.run()
+    _run_loader(loader)
 
 def local_bootstrap_sample():
     """
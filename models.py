@@ -1,19 +1,80 @@
 #!/usr/bin/env python
 
+from collections import deque
+from contextlib import contextmanager
 import datetime
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
 import os
 import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
 
 import csvkit
 from dateutil.parser import parse
-import mechanize
+import numpy as np
+import openpyxl
 from peewee import *
 from playhouse.sqlite_ext import SqliteExtDatabase
 
 import app_config
+import scraper
 
 database = SqliteExtDatabase('stl-lobbying.sqlite')
 
+# Rows per transaction when bulk loading
+BULK_INSERT_BATCH_SIZE = 1000
+
+# Rows per chunk as they flow through the loader
+LOAD_CHUNK_SIZE = 1000
+
+# Distinct date strings remembered by DateParser
+DATE_CACHE_SIZE = 10000
+
+# Default SQLITE_MAX_VARIABLE_NUMBER for older SQLite builds
+SQLITE_MAX_VARIABLES = 999
+
+# Connection settings while rebuilding the database from scratch...
+BULK_LOAD_PRAGMAS = [
+    ('journal_mode', 'MEMORY'),
+    ('synchronous', 'OFF'),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -256000)
+]
+
+# ...and the safe defaults restored afterwards
+SERVING_PRAGMAS = [
+    ('journal_mode', 'DELETE'),
+    ('synchronous', 'FULL'),
+    ('temp_store', 'DEFAULT'),
+    ('cache_size', -2000)
+]
+
+# Example messages kept in memory for each diagnostic code
+DIAGNOSTIC_EXAMPLES = 5
+
+# Yearly MEC workbooks, one sheet per expenditure type
+EXPENDITURE_WORKBOOKS_PATH = 'data/expenditures'
+
+# Workbook sheet name suffixes and the columns that differ from the CSV exports
+WORKBOOK_SHEETS = {
+    'individual': 'Indiv',
+    'solicitation': 'Sol',
+    'group': 'Group'
+}
+
+WORKBOOK_COLUMNS = {
+    'Cost': 'Amount',
+    'Pub Off': 'Pub Official',
+    'Indv ID': 'Indiv ID'
+}
+
 class SlugModel(Model):
     """
     A legislator.
@@ -31,9 +92,9 @@ class SlugModel(Model):
 
         super(SlugModel, self).save(*args, **kwargs)
 
-    def slugify(self):
+    def base_slug(self):
         """
-        Generate a slug.
+        Slug built from slug_fields, before any uniqueness suffix.
         """
         bits = []
 
@@ -47,17 +108,59 @@ class SlugModel(Model):
 
                 bits.append(attr)
 
-        base_slug = '-'.join(bits)
+        return '-'.join(bits)
+
+    def slugify(self):
+        """
+        Generate a slug that is unique for this model.
+
+        To slug many rows at once use a SlugRegistry instead.
+        """
+        cls = self.__class__
+        base_slug = self.base_slug()
 
         slug = base_slug
         i = 1
 
-        while Legislator.select().where(Legislator.slug == slug).count():
+        while cls.select().where(cls.slug == slug).count():
             i += 1
             slug = '%s-%i' % (base_slug, i)
 
         self.slug = slug
 
+class SlugRegistry(object):
+    """
+    Every slug in use for each SlugModel class, loaded with one query
+    per class, so unique slugs can be assigned to many new rows in memory.
+    """
+    def __init__(self):
+        self.slugs = {}
+
+    def get(self, model_class):
+        if model_class not in self.slugs:
+            self.slugs[model_class] = set(slug for (slug,) in model_class.select(model_class.slug).tuples())
+
+        return self.slugs[model_class]
+
+    def assign(self, instance):
+        """
+        Give an instance a unique slug and reserve it.
+        """
+        slugs = self.get(instance.__class__)
+        base_slug = instance.base_slug()
+
+        slug = base_slug
+        i = 1
+
+        while slug in slugs:
+            i += 1
+            slug = '%s-%i' % (base_slug, i)
+
+        slugs.add(slug)
+        instance.slug = slug
+
+        return slug
+
 class Lobbyist(SlugModel):
     """
     A lobbyist.
@@ -101,6 +204,28 @@ class Legislator(SlugModel):
     def url(self):
         return '/legislators/%s/' % self.slug
 
+    def download_url(self):
+        return '/download/legislators/lobbyingmissouri-%s.csv' % self.slug
+
+    def recent_expenditures(self, since):
+        """
+        Expenditures on this legislator since a month, largest first.
+        """
+        return Expenditure.select_related().where(Expenditure.legislator == self, Expenditure.report_period >= since).order_by(Expenditure.cost.desc())
+
+    def top_organizations(self):
+        """
+        Organizations that spent on this legislator, with their
+        total_spending, largest first.
+        """
+        total_spending = fn.Sum(Expenditure.cost)
+
+        return (Organization.select(Organization, total_spending.alias('total_spending'))
+            .join(Expenditure)
+            .where(Expenditure.legislator == self)
+            .group_by(Organization)
+            .order_by(total_spending.desc(), Organization.id))
+
     def official_url(self):
         if self.office == 'Representative':
             year = datetime.date.today().year
@@ -144,6 +269,29 @@ class Organization(SlugModel):
     def url(self):
         return '/organizations/%s/' % self.slug
 
+    def download_url(self):
+        return '/download/organizations/lobbyingmissouri-%s.csv' % self.slug
+
+    def recent_expenditures(self, since):
+        """
+        Expenditures by this organization since a month, largest first.
+        """
+        return Expenditure.select_related().where(Expenditure.organization == self, Expenditure.report_period >= since).order_by(Expenditure.cost.desc())
+
+    def top_legislators(self):
+        """
+        Legislators this organization spent on, with their
+        total_spending, largest first. The inner join leaves out groups
+        and old/non-attributable expenses.
+        """
+        total_spending = fn.Sum(Expenditure.cost)
+
+        return (Legislator.select(Legislator, total_spending.alias('total_spending'))
+            .join(Expenditure)
+            .where(Expenditure.organization == self)
+            .group_by(Legislator)
+            .order_by(total_spending.desc(), Legislator.id))
+
 class Expenditure(Model):
     """
     An expenditure.
@@ -159,28 +307,1695 @@ class Expenditure(Model):
     cost = FloatField()
     organization = ForeignKeyField(Organization, related_name='expenditures')
     group = ForeignKeyField(Group, related_name='expenditures', null=True)
-    ethics_id = IntegerField()
+    ethics_id = IntegerField(index=True)
     is_solicitation = BooleanField()
     
     class Meta:
         database = database
 
-def delete_tables():
+        # Pages filter on report_period, group by legislator/organization
+        # and sum or sort by cost, so cost rides along to cover those
+        indexes = (
+            (('report_period', 'cost'), False),
+            (('legislator', 'report_period', 'cost'), False),
+            (('organization', 'report_period', 'cost'), False),
+            (('lobbyist', 'report_period'), False),
+        )
+
+    @classmethod
+    def select_related(cls):
+        """
+        Expenditures with their lobbyist, organization, legislator and
+        group read in the same query.
+        """
+        return (cls.select(cls, Lobbyist, Organization, Legislator, Group)
+            .join(Lobbyist).switch(cls)
+            .join(Organization).switch(cls)
+            .join(Legislator, JOIN_LEFT_OUTER).switch(cls)
+            .join(Group, JOIN_LEFT_OUTER).switch(cls))
+
+    def prepared(self):
+        """
+        Outer joins with no matching row still build an empty related
+        instance. Drop it so the relation reads as None.
+        """
+        for name in ['legislator', 'group']:
+            related = self._obj_cache.get(name)
+
+            if related is not None and related.get_id() is None:
+                del self._obj_cache[name]
+
+    @classmethod
+    def _create_indexes(cls):
+        """
+        Skip single-column indexes on foreign keys that lead a composite index.
+        """
+        for fields, unique in model_indexes(cls):
+            cls._meta.database.create_index(cls, fields, unique)
+
+class Amendment(Model):
+    """
+    An ethics id that was replaced by an amendment.
+    """
+    expenditure_type = CharField()
+    original_id = IntegerField()
+    amendment_id = IntegerField()
+
+    class Meta:
+        database = database
+
+class DataFile(Model):
+    """
+    A loaded input file and the checksum of its contents.
+    """
+    path = CharField(unique=True)
+    checksum = CharField()
+
+    class Meta:
+        database = database
+
+def window_start(latest_report_period):
+    """
+    The first month of the 24 reporting periods up to and including
+    the latest one.
+    """
+    # Get the previous month. If previous month is December, set to 12.
+    month = latest_report_period.month + 1
+
+    if month > 12:
+        month = 12
+
+    return datetime.date(latest_report_period.year - 2, month, 1)
+
+class Dataset(Model):
+    """
+    Metadata about the loaded data, recorded at the end of each load.
+    There is only ever one row.
+
+    The version is a hash of the loaded rows, so anything cached from
+    the data can be keyed on it. Surrogate ids are left out, so the same
+    data gets the same version however it was loaded.
+    """
+    version = CharField()
+    loaded = DateTimeField()
+    latest_report_period = DateField(null=True)
+    window_start = DateField(null=True)
+    expenditures = IntegerField()
+    legislators = IntegerField()
+    organizations = IntegerField()
+    lobbyists = IntegerField()
+    groups = IntegerField()
+
+    # Tables whose rows make up the version hash
+    CONTENT_MODELS = [Group, Lobbyist, Legislator, Organization, Expenditure]
+
+    class Meta:
+        database = database
+
+    @classmethod
+    def content_sql(cls, model):
+        """
+        Every row of a content table without its id, with foreign keys
+        replaced by the related row's slug, in column order.
+        """
+        columns = []
+        joins = []
+
+        for field in model._meta.get_fields():
+            if field is model._meta.primary_key:
+                continue
+
+            if isinstance(field, ForeignKeyField):
+                alias = 'r%i' % len(joins)
+                joins.append('LEFT JOIN "%s" AS %s ON %s."id" = t."%s"' % (field.rel_model._meta.db_table, alias, alias, field.db_column))
+                columns.append('%s."slug"' % alias)
+            else:
+                columns.append('t."%s"' % field.db_column)
+
+        columns = ', '.join(columns)
+
+        return 'SELECT %s FROM "%s" AS t %s ORDER BY %s' % (columns, model._meta.db_table, ' '.join(joins), columns)
+
+    @classmethod
+    def content_hash(cls):
+        """
+        SHA-1 of every row of the content tables.
+        """
+        sha = hashlib.sha1()
+
+        for model in cls.CONTENT_MODELS:
+            sha.update(model._meta.db_table)
+
+            for row in database.execute_sql(cls.content_sql(model)):
+                sha.update(repr(row))
+
+        return sha.hexdigest()
+
+    @classmethod
+    def record(cls):
+        """
+        Measure the loaded data and replace the recorded metadata.
+        """
+        latest = Expenditure.select(Expenditure.report_period).order_by(Expenditure.report_period.desc()).first()
+        latest = latest.report_period if latest else None
+
+        with database.transaction():
+            cls.delete().execute()
+
+            return cls.create(
+                version=cls.content_hash(),
+                loaded=datetime.datetime.now(),
+                latest_report_period=latest,
+                window_start=window_start(latest) if latest else None,
+                expenditures=Expenditure.select().count(),
+                legislators=Legislator.select().count(),
+                organizations=Organization.select().count(),
+                lobbyists=Lobbyist.select().count(),
+                groups=Group.select().count()
+            )
+
+class Rollup(Model):
+    """
+    Monthly expenditure totals for one dimension, rebuilt from the
+    expenditure table after each load.
+    """
+    month = DateField()
+    total = FloatField()
+    count = IntegerField()
+
+    # Dimension field, and the SQL it is computed from. Expenditures
+    # are aliased "e" and their organizations "o".
+    dimension = None
+    source_sql = None
+
+    @classmethod
+    def build(cls):
+        """
+        Replace the rollup's rows. Returns the number of rows written.
+        """
+        table = cls._meta.db_table
+        column = cls._meta.fields[cls.dimension].db_column
+
+        database.execute_sql('DELETE FROM "%s"' % table)
+
+        return database.execute_sql("""
+            INSERT INTO "%(table)s" ("%(column)s", "month", "total", "count")
+            SELECT %(source)s, date(e."report_period", 'start of month'), SUM(e."cost"), COUNT(*)
+            FROM "expenditure" AS e
+            INNER JOIN "organization" AS o ON o."id" = e."organization_id"
+            WHERE %(source)s IS NOT NULL
+            GROUP BY 1, 2
+        """ % {
+            'table': table,
+            'column': column,
+            'source': cls.source_sql
+        }).rowcount
+
+    @classmethod
+    def totals(cls, since=None):
+        """
+        Total spending and expenditure count per dimension value, for
+        all time or since a month.
+        """
+        dimension = cls._meta.fields[cls.dimension]
+        query = cls.select(dimension, fn.Sum(cls.total).alias('total_spending'), fn.Sum(cls.count).alias('total_expenditures'))
+
+        if since:
+            query = query.where(cls.month >= since)
+
+        return query.group_by(dimension)
+
+    @classmethod
+    def ranked(cls, since=None):
+        """
+        Instances of the dimension's model that have expenditures, by
+        total spending, with total_spending and total_expenditures set.
+        """
+        model = cls._meta.fields[cls.dimension].rel_model
+        total_spending = fn.Sum(cls.total)
+
+        query = model.select(model, total_spending.alias('total_spending'), fn.Sum(cls.count).alias('total_expenditures')).join(cls)
+
+        if since:
+            query = query.where(cls.month >= since)
+
+        return query.group_by(model).order_by(total_spending.desc(), model.id)
+
+    @classmethod
+    def spending(cls, since=None, **dimension):
+        """
+        (spending, count) for one dimension value or, with no dimension,
+        for all expenditures.
+        """
+        query = cls.select(fn.Sum(cls.total), fn.Sum(cls.count))
+
+        if since:
+            query = query.where(cls.month >= since)
+
+        for name, value in dimension.items():
+            query = query.where(cls._meta.fields[name] == value)
+
+        spending, count = query.tuples()[0]
+
+        return spending or 0, count or 0
+
+class LegislatorMonth(Rollup):
+    legislator = ForeignKeyField(Legislator, related_name='months')
+
+    dimension = 'legislator'
+    source_sql = 'e."legislator_id"'
+
+    class Meta:
+        database = database
+        indexes = (
+            (('month', 'legislator'), True),
+        )
+
+class OrganizationMonth(Rollup):
+    organization = ForeignKeyField(Organization, related_name='months')
+
+    dimension = 'organization'
+    source_sql = 'e."organization_id"'
+
+    class Meta:
+        database = database
+        indexes = (
+            (('month', 'organization'), True),
+        )
+
+class CategoryMonth(Rollup):
+    """
+    Totals by the spending organization's category.
+    """
+    category = CharField()
+
+    dimension = 'category'
+    source_sql = 'o."category"'
+
+    class Meta:
+        database = database
+        indexes = (
+            (('month', 'category'), True),
+        )
+
+class LobbyistMonth(Rollup):
+    lobbyist = ForeignKeyField(Lobbyist, related_name='months')
+
+    dimension = 'lobbyist'
+    source_sql = 'e."lobbyist_id"'
+
+    class Meta:
+        database = database
+        indexes = (
+            (('month', 'lobbyist'), True),
+        )
+
+ROLLUPS = [LegislatorMonth, OrganizationMonth, CategoryMonth, LobbyistMonth]
+
+MODELS = [Group, Lobbyist, Legislator, Organization, Expenditure, Amendment, DataFile, Dataset] + ROLLUPS
+
+def build_rollups():
+    """
+    Rebuild every rollup table. Returns the number of rows written.
+    """
+    with database.transaction():
+        return sum(rollup.build() for rollup in ROLLUPS)
+
+class RankIndex(object):
+    """
+    Spending ranks of every value of every rollup dimension, for all
+    time or since a month.
+
+    Spending is compared to the cent. Ties share a rank and the ranks
+    after them are skipped, so two legislators tied for 2nd are
+    followed by the 4th.
+    """
+    def __init__(self, since=None):
+        self.ranks = {}
+
+        for rollup in ROLLUPS:
+            self.add(rollup, since)
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def add(self, rollup, since=None):
+        query = rollup.totals(since).order_by(fn.Sum(rollup.total).desc()).tuples()
+        previous = None
+
+        for i, (value, spending, count) in enumerate(query, 1):
+            spending = round(spending, 2)
+
+            if spending != previous:
+                rank = i
+                previous = spending
+
+            self.ranks[(rollup.dimension, value)] = rank
+
+    def rank(self, dimension, value):
+        """
+        The rank of a dimension value or model instance, or None if it
+        has no expenditures.
+        """
+        if isinstance(value, Model):
+            value = value.id
+
+        return self.ranks.get((dimension, value))
+
+def delete_tables():
+    """
+    Clear data from sqlite.
+    """
+    for cls in MODELS:
+        try:
+            cls.drop_table()
+        except:
+            continue
+
+# Indexes the loader itself queries, e.g. to delete superseded rows, so
+# they are built before a bulk load rather than after it
+LOAD_INDEXES = [
+    (Expenditure, ['ethics_id'])
+]
+
+def create_tables(indexes=True):
+    """
+    Create database tables for each model. Pass indexes=False to leave
+    secondary indexes other than LOAD_INDEXES for create_indexes() after
+    a bulk load.
+    """
+    for cls in MODELS:
+        if indexes:
+            cls.create_table()
+        else:
+            database.create_table(cls)
+
+    if not indexes:
+        for cls, fields in LOAD_INDEXES:
+            database.create_index(cls, fields)
+
+def model_indexes(cls):
+    """
+    The (fields, unique) of each secondary index of a model. Foreign keys
+    that lead a composite index don't get an index of their own.
+    """
+    leading = set(fields[0] for fields, unique in cls._meta.indexes or ())
+
+    for name, field in cls._meta.fields.items():
+        if field.primary_key:
+            continue
+
+        if isinstance(field, ForeignKeyField):
+            if name not in leading:
+                yield [field], field.unique
+        elif field.index or field.unique:
+            yield [field], field.unique
+
+    for fields, unique in cls._meta.indexes or ():
+        yield [cls._meta.fields[f] for f in fields], unique
+
+def create_indexes():
+    """
+    Create secondary indexes for each model that don't exist yet.
+    """
+    existing = set(name for (name,) in database.execute_sql("SELECT name FROM sqlite_master WHERE type = 'index'"))
+
+    for cls in MODELS:
+        for fields, unique in model_indexes(cls):
+            name = '%s_%s' % (cls._meta.db_table, '_'.join(f.db_column for f in fields))
+
+            if name not in existing:
+                database.create_index(cls, fields, unique)
+
+def set_pragmas(pragmas):
+    for name, value in pragmas:
+        database.execute_sql('PRAGMA %s = %s' % (name, value))
+
+@contextmanager
+def bulk_load():
+    """
+    Rebuild tables created with create_tables(indexes=False) using relaxed
+    durability and a large page cache. Afterwards build the indexes,
+    ANALYZE and VACUUM, and restore safe serving settings.
+
+    A crash mid-load can corrupt the file, which is fine for a rebuild.
+    """
+    set_pragmas(BULK_LOAD_PRAGMAS)
+
+    try:
+        yield
+
+        timer = StageTimer()
+
+        with timer.time('create indexes'):
+            create_indexes()
+
+        with timer.time('analyze'):
+            database.execute_sql('ANALYZE')
+
+        with timer.time('vacuum'):
+            database.execute_sql('VACUUM')
+
+        print 'BULK LOAD'
+        print '---------'
+
+        timer.report()
+        print ''
+    finally:
+        set_pragmas(SERVING_PRAGMAS)
+
+# Tables too big to read in full when serving a page
+SCAN_CHECKED_TABLES = ['expenditure']
+
+class QueryLog(logging.Handler):
+    """
+    Collect the SQL and parameters of every query peewee runs.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.queries = []
+
+    def emit(self, record):
+        if isinstance(record.msg, tuple):
+            self.queries.append(record.msg)
+
+    @contextmanager
+    def capture(self):
+        logger = logging.getLogger('peewee')
+        level = logger.level
+
+        logger.addHandler(self)
+        logger.setLevel(logging.DEBUG)
+
+        try:
+            yield self
+        finally:
+            logger.removeHandler(self)
+            logger.setLevel(level)
+
+def full_table_scans(sql, params=None, tables=SCAN_CHECKED_TABLES):
+    """
+    Tables that EXPLAIN QUERY PLAN says a query reads without an index.
+    """
+    aliases = dict((alias, table) for table, alias in re.findall(r'"(\w+)" AS (\w+)', sql))
+    scans = []
+
+    for row in database.execute_sql('EXPLAIN QUERY PLAN %s' % sql, params or ()):
+        match = re.match(r'SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$', row[-1])
+
+        if not match:
+            continue
+
+        table = aliases.get(match.group(1), match.group(1))
+
+        if table in tables:
+            scans.append(table)
+
+    return scans
+
+def file_checksum(path):
+    """
+    SHA-1 of a file's contents.
+    """
+    sha = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), ''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+def bulk_insert(model_class, rows, batch_size=BULK_INSERT_BATCH_SIZE):
+    """
+    Insert model instances using multi-row INSERTs.
+
+    Each batch is written in its own transaction. Statements are
+    split further so no single INSERT exceeds SQLite's variable limit.
+    Returns the number of rows inserted.
+    """
+    fields = [f for f in model_class._meta.get_fields() if f is not model_class._meta.primary_key]
+    columns = ', '.join(database.quote_char + f.db_column + database.quote_char for f in fields)
+    placeholder = '(%s)' % ', '.join([database.interpolation] * len(fields))
+    rows_per_statement = max(1, min(batch_size, SQLITE_MAX_VARIABLES // len(fields)))
+
+    table = database.quote_char + model_class._meta.db_table + database.quote_char
+    inserted = 0
+    batch = []
+
+    def flush(batch):
+        with database.transaction():
+            for i in range(0, len(batch), rows_per_statement):
+                chunk = batch[i:i + rows_per_statement]
+                params = []
+
+                for instance in chunk:
+                    params.extend(f.db_value(getattr(instance, f.name)) for f in fields)
+
+                sql = 'INSERT INTO %s (%s) VALUES %s' % (table, columns, ', '.join([placeholder] * len(chunk)))
+                database.execute_sql(sql, params)
+
+    for instance in rows:
+        batch.append(instance)
+
+        if len(batch) >= batch_size:
+            flush(batch)
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+        inserted += len(batch)
+
+    return inserted
+
+def delete_expenditures(expenditure_type, ethics_ids):
+    """
+    Delete expenditures of one type by ethics id.
+    Returns the number of rows deleted.
+    """
+    if expenditure_type == 'solicitation':
+        type_clause = (Expenditure.is_solicitation == True)
+    elif expenditure_type == 'group':
+        type_clause = ~(Expenditure.group >> None)
+    else:
+        type_clause = (Expenditure.is_solicitation == False) & (Expenditure.group >> None)
+
+    ethics_ids = list(ethics_ids)
+    deleted = 0
+
+    with database.transaction():
+        for i in range(0, len(ethics_ids), SQLITE_MAX_VARIABLES - 1):
+            chunk = ethics_ids[i:i + SQLITE_MAX_VARIABLES - 1]
+            deleted += Expenditure.delete().where(type_clause & (Expenditure.ethics_id << chunk)).execute()
+
+    return deleted
+
+def chunked(iterable, size):
+    """
+    Group an iterable into lists of at most size items.
+    """
+    chunk = []
+
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def cell_text(value):
+    """
+    Format a workbook cell the way it appears in the CSV exports.
+    """
+    if value is None:
+        return u''
+
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return u'%i/%i/%i' % (value.month, value.day, value.year)
+
+    if isinstance(value, float) and value.is_integer():
+        return unicode(int(value))
+
+    return unicode(value).strip()
+
+def read_workbook_rows(path, expenditure_type):
+    """
+    Stream rows of one expenditure type from a yearly MEC workbook.
+
+    The workbook is opened read-only, so rows are read from the sheet's
+    XML as they are needed rather than loading the whole sheet.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+
+    try:
+        suffix = WORKBOOK_SHEETS[expenditure_type]
+        sheet = [s for s in workbook.worksheets if s.title.strip().endswith(suffix)][0]
+
+        rows = sheet.iter_rows(values_only=True)
+        header = [WORKBOOK_COLUMNS.get(h, h) for h in map(cell_text, next(rows, []))]
+
+        for values in rows:
+            # Formatted but empty rows
+            if all(v is None for v in values):
+                continue
+
+            yield dict(zip(header, map(cell_text, values)))
+    finally:
+        workbook.close()
+
+def parse_ethics_id(value):
+    """
+    Convert an MEC ID column to an int. Returns None for blank or
+    malformed IDs.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def coerce_currency(values):
+    """
+    Convert currency strings like "$7,083.69 " or "($12.00)" to integer
+    cents. Returns (cents, valid) arrays; invalid entries are 0 cents.
+    """
+    strings = np.char.strip(np.array(values, dtype=np.unicode_))
+    negative = np.char.startswith(strings, u'(') & np.char.endswith(strings, u')')
+
+    for c in u'$,()':
+        strings = np.char.replace(strings, c, u'')
+
+    valid = strings != u''
+    strings = np.where(valid, strings, u'0')
+
+    try:
+        dollars = strings.astype(np.float64)
+    except ValueError:
+        # Fall back to one value at a time to find the bad ones
+        dollars = np.zeros(len(strings))
+
+        for i, value in enumerate(strings):
+            try:
+                dollars[i] = float(value)
+            except ValueError:
+                valid[i] = False
+
+    cents = np.rint(dollars * 100).astype(np.int64)
+    cents[negative] *= -1
+
+    return cents, valid
+
+def coerce_dates(values, parse_date):
+    """
+    Convert date strings to proleptic Gregorian ordinals, parsing each
+    distinct string once. Returns (ordinals, dates); unparseable entries
+    have ordinal 0 and date None.
+    """
+    uniques, inverse = np.unique(np.array(values, dtype=np.unicode_), return_inverse=True)
+    parsed = []
+
+    for value in uniques:
+        try:
+            parsed.append(parse_date(value))
+        except (ValueError, OverflowError):
+            parsed.append(None)
+
+    ordinals = np.array([d.toordinal() if d else 0 for d in parsed], dtype=np.int64)
+    dates = np.array(parsed, dtype=object)
+
+    return ordinals[inverse], dates[inverse]
+
+def resource_usage():
+    """
+    CPU seconds used and peak resident set size in KB for this process.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    peak_rss = usage.ru_maxrss
+
+    # Reported in bytes on OS X, KB elsewhere
+    if sys.platform == 'darwin':
+        peak_rss /= 1024
+
+    return usage.ru_utime + usage.ru_stime, peak_rss
+
+class StageTimer(object):
+    """
+    Accumulate wall time, CPU time, peak RSS and row counts for each
+    stage of a load.
+    """
+    class Stage(object):
+        def __init__(self):
+            self.rows = 0
+            self.seconds = 0.0
+            self.cpu_seconds = 0.0
+            self.peak_rss = 0
+
+        def rows_per_second(self):
+            return self.rows / max(self.seconds, 0.001)
+
+        def as_dict(self):
+            return {
+                'rows': self.rows,
+                'wall_seconds': round(self.seconds, 4),
+                'cpu_seconds': round(self.cpu_seconds, 4),
+                'rows_per_second': round(self.rows_per_second(), 1),
+                'peak_rss_kb': self.peak_rss
+            }
+
+    def __init__(self):
+        self.stages = {}
+        self.order = []
+
+    def get(self, name):
+        if name not in self.stages:
+            self.stages[name] = self.Stage()
+            self.order.append(name)
+
+        return self.stages[name]
+
+    def measure(self, stage, start, start_cpu):
+        cpu, peak_rss = resource_usage()
+
+        stage.seconds += time.time() - start
+        stage.cpu_seconds += cpu - start_cpu
+        stage.peak_rss = max(stage.peak_rss, peak_rss)
+
+    @contextmanager
+    def time(self, name, rows=0):
+        """
+        Time a block. The block may set rows on the yielded stage.
+        """
+        stage = self.get(name)
+        elapsed = self.Stage()
+        elapsed.rows = rows
+
+        start = time.time()
+        start_cpu = resource_usage()[0]
+
+        try:
+            yield elapsed
+        finally:
+            self.measure(stage, start, start_cpu)
+            stage.rows += elapsed.rows
+
+    def add(self, name, rows, seconds, cpu_seconds=0.0, peak_rss=0):
+        """
+        Merge totals measured elsewhere, e.g. in a worker process.
+        """
+        stage = self.get(name)
+        stage.rows += rows
+        stage.seconds += seconds
+        stage.cpu_seconds += cpu_seconds
+        stage.peak_rss = max(stage.peak_rss, peak_rss)
+
+    def totals(self):
+        return [(name, s.rows, s.seconds, s.cpu_seconds, s.peak_rss) for name, s in self.items()]
+
+    def items(self):
+        return [(name, self.stages[name]) for name in self.order]
+
+    def timed(self, name, chunks):
+        """
+        Time how long an iterator of chunks takes to produce each chunk.
+        """
+        stage = self.get(name)
+        chunks = iter(chunks)
+
+        while True:
+            start = time.time()
+            start_cpu = resource_usage()[0]
+
+            try:
+                chunk = next(chunks)
+            finally:
+                self.measure(stage, start, start_cpu)
+
+            stage.rows += len(chunk)
+
+            yield chunk
+
+    def report(self):
+        for name, stage in self.items():
+            print '%-16s %8i rows %8.2fs %8.2fs cpu %10i rows/sec %8i KB peak' % (name, stage.rows, stage.seconds, stage.cpu_seconds, stage.rows_per_second(), stage.peak_rss)
+
+class Diagnostics(object):
+    """
+    Loader warnings and errors.
+
+    Every message is appended to a log file as it happens. In memory only
+    counts per (level, code, year) and the first few examples of each
+    code are kept, so the end-of-run report stays small.
+    """
+    def __init__(self, path=None, max_examples=DIAGNOSTIC_EXAMPLES):
+        self.path = path
+        self.max_examples = max_examples
+
+        self.counts = {}
+        self.examples = {}
+        self.log_file = None
+
+    def format(self, msg, year=None, line=None):
+        if line:
+            msg = '%05i -- %s' % (line, msg)
+
+        if year:
+            msg = '%i -- %s' % (year, msg)
+
+        return msg
+
+    def log(self, level, code, msg, year=None, line=None):
+        msg = self.format(msg, year, line)
+
+        if self.path:
+            if not self.log_file:
+                self.log_file = open(self.path, 'a')
+
+            entry = u'%s %s %s %s\n' % (datetime.datetime.now().isoformat(), level.upper(), code, msg)
+            self.log_file.write(entry.encode('utf-8'))
+
+        key = (level, code)
+        by_year = self.counts.setdefault(key, {})
+        by_year[year] = by_year.get(year, 0) + 1
+
+        examples = self.examples.setdefault(key, [])
+
+        if len(examples) < self.max_examples:
+            examples.append(msg)
+
+    def close(self):
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+    def codes(self, level):
+        return sorted(code for l, code in self.counts if l == level)
+
+    def count(self, level, code=None):
+        return sum(
+            sum(by_year.values()) for (l, c), by_year in self.counts.items()
+            if l == level and code in (None, c)
+        )
+
+    def summary(self):
+        """
+        Counts per level, code and year, for machine-readable reports.
+        """
+        summary = {}
+
+        for (level, code), by_year in self.counts.items():
+            summary.setdefault(level, {})[code] = dict((str(year or ''), count) for year, count in by_year.items())
+
+        return summary
+
+    def report(self, level):
+        for code in self.codes(level):
+            by_year = self.counts[(level, code)]
+            years = ', '.join('%s: %i' % (year or '-', by_year[year]) for year in sorted(by_year))
+
+            print '%s: %i (%s)' % (code, self.count(level, code), years)
+
+            for example in self.examples[(level, code)]:
+                print '    %s' % example
+
+class Manifest(object):
+    """
+    Checksums of the input files used by the last load, so an
+    incremental load can skip files that haven't changed.
+    """
+    def __init__(self):
+        self.loaded = {}
+        self.checksums = {}
+
+    def preload(self):
+        if not DataFile.table_exists():
+            return
+
+        for data_file in DataFile.select():
+            self.loaded[data_file.path] = data_file.checksum
+
+    def checksum(self, path):
+        if path not in self.checksums:
+            self.checksums[path] = file_checksum(path)
+
+        return self.checksums[path]
+
+    def changed(self, path):
+        return self.loaded.get(path) != self.checksum(path)
+
+    def record(self, path):
+        """
+        Record that a file has been loaded.
+        """
+        checksum = self.checksum(path)
+
+        if not DataFile.update(checksum=checksum).where(DataFile.path == path).execute():
+            DataFile.create(path=path, checksum=checksum)
+
+        self.loaded[path] = checksum
+
+class DateParser(object):
+    """
+    Parse the date formats used in MEC exports, e.g. "4/1/2013" and
+    "Jan-13" (a report month), with a bounded cache of seen strings.
+
+    Anything else falls back to dateutil and is counted by shape so
+    new formats are easy to spot.
+    """
+    MONTHS = dict((name, i) for i, name in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1))
+
+    def __init__(self, cache_size=DATE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = {}
+
+    def __call__(self, value):
+        try:
+            d = self.cache[value]
+            self.hits += 1
+
+            return d
+        except KeyError:
+            self.misses += 1
+
+        d = self.parse(value)
+
+        # Cheap bound; the working set is a few hundred strings per year
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+
+        self.cache[value] = d
+
+        return d
+
+    def merge(self, other):
+        """
+        Add counts from a parser used in another process.
+        """
+        self.hits += other.hits
+        self.misses += other.misses
+
+        for shape, count in other.fallbacks.items():
+            self.fallbacks[shape] = self.fallbacks.get(shape, 0) + count
+
+    def parse(self, value):
+        # 4/1/2013
+        bits = value.split('/')
+
+        if len(bits) == 3 and all(bit.isdigit() for bit in bits) and len(bits[2]) == 4:
+            return datetime.date(int(bits[2]), int(bits[0]), int(bits[1]))
+
+        # Jan-13
+        bits = value.split('-')
+
+        if len(bits) == 2 and len(bits[1]) == 2 and bits[1].isdigit():
+            month = self.MONTHS.get(bits[0][:3].lower())
+
+            if month:
+                return datetime.date(2000 + int(bits[1]), month, 1)
+
+        shape = re.sub(r'[a-zA-Z]+', 'a', re.sub(r'\d+', '9', value))
+        self.fallbacks[shape] = self.fallbacks.get(shape, 0) + 1
+
+        return parse(value).date()
+
+class IdentityMap(object):
+    """
+    An in-memory index of model instances keyed on a natural key.
+
+    New instances are staged in memory and written in bulk by flush().
+    """
+    def __init__(self, model_class, key_fields, slug_registry=None):
+        self.model_class = model_class
+        self.key_fields = key_fields
+        self.slug_registry = slug_registry or SlugRegistry()
+
+        self.instances = {}
+        self.pending = []
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.instances)
+
+    def key(self, instance):
+        return tuple(getattr(instance, field) for field in self.key_fields)
+
+    def preload(self):
+        """
+        Index every instance already in the database.
+        """
+        for instance in self.model_class.select().order_by(self.model_class.id):
+            self.instances.setdefault(self.key(instance), instance)
+
+    def add(self, instance):
+        """
+        Index an instance, staging it for creation if it is unsaved.
+        """
+        self.instances.setdefault(self.key(instance), instance)
+
+        if instance.id is None:
+            self.pending.append(instance)
+
+        return instance
+
+    def get(self, *key):
+        """
+        Look up an instance by natural key.
+        """
+        instance = self.instances.get(key)
+
+        if instance is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return instance
+
+    def get_or_create(self, **fields):
+        """
+        Look up an instance, staging a new one if it doesn't exist.
+        """
+        instance = self.get(*[fields[field] for field in self.key_fields])
+
+        if instance is not None:
+            return False, instance
+
+        return True, self.add(self.model_class(**fields))
+
+    def flush(self, batch_size=BULK_INSERT_BATCH_SIZE):
+        """
+        Bulk insert staged instances and assign their ids.
+        """
+        if not self.pending:
+            return 0
+
+        for instance in self.pending:
+            if isinstance(instance, SlugModel) and not instance.slug:
+                self.slug_registry.assign(instance)
+
+        last_id = self.model_class.select(fn.Max(self.model_class.id)).scalar() or 0
+
+        bulk_insert(self.model_class, self.pending, batch_size)
+
+        created = self.model_class.select().where(self.model_class.id > last_id).order_by(self.model_class.id)
+
+        for instance, saved in zip(self.pending, created):
+            instance.id = saved.id
+
+        flushed = len(self.pending)
+        self.pending = []
+
+        return flushed
+
+class TrigramIndex(object):
+    """
+    Fuzzy lookup of names by shared trigrams.
+
+    Each name is split into padded word trigrams and listed under each
+    of them, so a query only scores names that share at least one
+    trigram with it rather than comparing against every name. Names
+    that normalize the same as one already indexed are skipped.
+    """
+    def __init__(self, names=()):
+        self.names = []
+        self.keys = set()
+        self.trigrams = []
+        self.postings = {}
+
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def normalize(name):
+        """
+        Lowercase words with punctuation removed.
+        """
+        return re.sub(r'[\W_]+', ' ', name.lower(), flags=re.UNICODE).strip()
+
+    @classmethod
+    def grams(cls, name):
+        """
+        The set of trigrams in a name, with each word padded so short
+        words and word boundaries still count.
+        """
+        grams = set()
+
+        for word in cls.normalize(name).split():
+            word = '  %s ' % word
+
+            for i in range(len(word) - 2):
+                grams.add(word[i:i + 3])
+
+        return grams
+
+    def add(self, name):
+        key = self.normalize(name)
+
+        if key in self.keys:
+            return
+
+        i = len(self.names)
+        grams = self.grams(name)
+
+        self.keys.add(key)
+        self.names.append(name)
+        self.trigrams.append(frozenset(grams))
+
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(i)
+
+    def search(self, name, limit=3, min_score=0.3):
+        """
+        Up to limit (name, score) pairs, best first. The score is the
+        Jaccard similarity of the two trigram sets.
+        """
+        grams = self.grams(name)
+
+        # A match shares at least `needed` of the query's trigrams, so it
+        # is listed under at least one of all but the commonest needed - 1
+        needed = int(math.ceil(min_score * len(grams))) or 1
+        rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set()
+
+        for gram in rarest[:len(grams) - needed + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        results = []
+
+        for i in candidates:
+            count = len(grams & self.trigrams[i])
+            score = float(count) / (len(grams) + len(self.trigrams[i]) - count)
+
+            if score >= min_score:
+                results.append((-score, self.names[i]))
+
+        results.sort()
+
+        return [(match, -score) for score, match in results[:limit]]
+
+    def search_many(self, names, limit=3, min_score=0.3):
+        """
+        Search for each of a batch of names, sharing work between names
+        that normalize the same. Returns a dict of name -> results.
+        """
+        results = {}
+        normalized = {}
+
+        for name in names:
+            key = self.normalize(name)
+
+            if key not in normalized:
+                normalized[key] = self.search(name, limit, min_score)
+
+            results[name] = normalized[key]
+
+        return results
+
+class LegislatorIndex(object):
+    """
+    Resolves legislator names as they appear in MEC exports.
+
+    Names are matched ignoring case, spacing and punctuation, after
+    applying an alias table of known misspellings. Recipient strings
+    repeat across many rows, so their parses and lookups are memoized.
+
+    Lookups are counted per call: hits (alias_hits of them only found
+    through an alias) and misses.
+    """
+    def __init__(self):
+        self.aliases = {}
+        self.legislators = {}
+
+        self.recipients = {}
+        self.corrected = {}
+        self.resolved = {}
+
+        self.hits = 0
+        self.alias_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(name):
+        """
+        Uppercase words, with commas kept to separate last and first names.
+        """
+        name = re.sub(r'[^\w,]+', ' ', name.upper(), flags=re.UNICODE)
+
+        return re.sub(r'\s*,\s*', ', ', name).strip()
+
+    def load_aliases(self, path):
+        """
+        Load a CSV of alias -> ethics name corrections.
+        """
+        with open(path) as f:
+            reader = csvkit.CSVKitReader(f)
+            reader.next()
+
+            for row in reader:
+                alias, ethics_name = map(unicode.strip, row)
+                self.aliases[self.normalize(alias)] = ethics_name
+
+        self.corrected = {}
+        self.resolved = {}
+
+    def correct(self, name):
+        """
+        The name, or the ethics name it is an alias for.
+        """
+        if name not in self.corrected:
+            self.corrected[name] = self.aliases.get(self.normalize(name), name)
+
+        return self.corrected[name]
+
+    def split(self, value):
+        """
+        Split a "NAME - Type" recipient into a (name, type), or None if
+        it has no type. Aliases are applied when the name is resolved.
+        """
+        if value not in self.recipients:
+            try:
+                name, recipient_type = map(unicode.strip, value.rsplit(' - ', 1))
+            except ValueError:
+                self.recipients[value] = None
+            else:
+                self.recipients[value] = (name, recipient_type)
+
+        return self.recipients[value]
+
+    def add(self, legislator):
+        if legislator.ethics_name:
+            self.legislators.setdefault(self.normalize(legislator.ethics_name), legislator)
+
+        self.resolved = {}
+
+    def get(self, name):
+        """
+        The legislator for a name, or None if they aren't current.
+        """
+        if name not in self.resolved:
+            corrected = self.correct(name)
+            legislator = self.legislators.get(self.normalize(corrected))
+
+            self.resolved[name] = (legislator, corrected != name)
+
+        legislator, aliased = self.resolved[name]
+
+        if legislator is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.alias_hits += aliased
+
+        return legislator
+
+class AmendmentIndex(object):
+    """
+    Hash index of amendments for each expenditure type.
+
+    Superseded expenditures are dropped as soon as both the original
+    and the amendment have been seen, whichever comes first.
+    """
+    TYPES = ['individual', 'group', 'solicitation']
+
+    def __init__(self, assume_written=False):
+        # When loading into an existing database, any original may
+        # already have been written by a previous load
+        self.assume_written = assume_written
+
+        # Original ethics id -> id of the row that amended it
+        self.amended_by = dict((t, {}) for t in self.TYPES)
+
+        # Ethics id -> staged expenditures with that id
+        self.staged = dict((t, {}) for t in self.TYPES)
+
+        # Ethics ids already written to the database
+        self.written = dict((t, set()) for t in self.TYPES)
+
+        # Written ethics ids that have since been amended
+        self.superseded = dict((t, set()) for t in self.TYPES)
+
+        self.removed = 0
+
+    def amend(self, expenditure_type, original_id, amendment_id):
+        """
+        Record an amendment, dropping the original if it is staged or
+        marking it for deletion if it has already been written.
+        """
+        self.amended_by[expenditure_type][original_id] = amendment_id
+
+        superseded = self.staged[expenditure_type].pop(original_id, [])
+        self.removed += len(superseded)
+
+        if self.assume_written or original_id in self.written[expenditure_type]:
+            self.superseded[expenditure_type].add(original_id)
+
+    def stage(self, expenditure_type, expenditure):
+        """
+        Stage an expenditure unless it has already been amended.
+        """
+        if expenditure.ethics_id in self.amended_by[expenditure_type]:
+            self.removed += 1
+
+            return False
+
+        self.staged[expenditure_type].setdefault(expenditure.ethics_id, []).append(expenditure)
+
+        return True
+
+    def drain(self):
+        """
+        Remove and return staged expenditures by type, marking them
+        as written.
+        """
+        drained = {}
+
+        for expenditure_type in self.TYPES:
+            staged = self.staged[expenditure_type]
+
+            drained[expenditure_type] = [e for expenditures in staged.values() for e in expenditures]
+
+            self.written[expenditure_type].update(staged)
+            staged.clear()
+
+        return drained
+
+    def drain_superseded(self):
+        """
+        Remove and return written ethics ids that need to be deleted.
+        """
+        for expenditure_type in self.TYPES:
+            superseded = self.superseded[expenditure_type]
+
+            if superseded:
+                self.superseded[expenditure_type] = set()
+
+                yield expenditure_type, superseded
+
+    def preload(self):
+        """
+        Load amendments recorded by previous loads.
+        """
+        for amendment in Amendment.select():
+            self.amended_by[amendment.expenditure_type][amendment.original_id] = amendment.amendment_id
+
+    def save(self, batch_size=BULK_INSERT_BATCH_SIZE):
+        """
+        Replace the recorded amendments with the contents of the index.
+        """
+        Amendment.delete().execute()
+
+        amendments = (
+            Amendment(expenditure_type=expenditure_type, original_id=original_id, amendment_id=amendment_id)
+            for expenditure_type in self.TYPES
+            for original_id, amendment_id in self.amended_by[expenditure_type].items()
+        )
+
+        return bulk_insert(Amendment, amendments, batch_size)
+
+    def chains(self, expenditure_type):
+        """
+        Follow chains of amendments, yielding each original id and the
+        list of ids that replaced it, in order.
+        """
+        amended_by = self.amended_by[expenditure_type]
+        amendment_ids = set(amended_by.values())
+
+        for original_id in sorted(amended_by):
+            # Only start at the head of a chain
+            if original_id in amendment_ids:
+                continue
+
+            chain = []
+            ethics_id = original_id
+
+            # Bounded in case the export ever contains a cycle
+            while ethics_id in amended_by and len(chain) <= len(amended_by):
+                ethics_id = amended_by[ethics_id]
+                chain.append(ethics_id)
+
+            yield original_id, chain
+
+    def write_report(self, path):
+        """
+        Write a CSV of original ids and the amendments that replaced them.
+        """
+        with open(path, 'w') as f:
+            writer = csvkit.CSVKitWriter(f)
+            writer.writerow(['type', 'original_id', 'amendment_ids', 'final_id'])
+
+            for expenditure_type in self.TYPES:
+                for original_id, chain in self.chains(expenditure_type):
+                    writer.writerow([expenditure_type, original_id, ' '.join(map(str, chain)), chain[-1]])
+
+class SnapshotCache(object):
+    """
+    Binary snapshots of parsed (year, type) files, keyed by the source
+    file's checksum, so unchanged files are never parsed twice.
+
+    Each snapshot is a directory of .npy files: one structured array of
+    record columns, one of record messages and a UTF-8 string table that
+    the other two index into. They are memory-mapped when read back.
+    """
+    # Bump when parsing or the record layout changes
+    VERSION = 2
+
+    STRING_FIELDS = ['lobbyist_first', 'lobbyist_last', 'group', 'legislator', 'recipient', 'recipient_type', 'category', 'description', 'principal']
+
+    RECORD_DTYPE = np.dtype([
+        ('line', np.int32),
+        ('ethics_id', np.int64),
+        ('amends', np.int64),
+        ('valid', np.bool_),
+        ('report_period', np.int32),
+        ('event_date', np.int32),
+        ('cost', np.float64)
+    ] + [(field, np.int32) for field in STRING_FIELDS])
+
+    MESSAGE_DTYPE = np.dtype([
+        ('record', np.int32),
+        ('level', np.int32),
+        ('code', np.int32),
+        ('msg', np.int32)
+    ])
+
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, source, year, expenditure_type, checksum):
+        return '%s_%s_%s_%s' % (source, year, expenditure_type, checksum)
+
+    def load(self, key, date_max):
+        """
+        Returns a Snapshot, or None if there is no usable snapshot.
+        """
+        path = os.path.join(self.path, key)
+
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except IOError:
+            return None
+
+        # Only valid while no date in the file crosses the "too new" cutoff
+        date_max = date_max.toordinal()
+        window = meta['date_window']
+
+        if meta['version'] != self.VERSION or not window[0] <= date_max < window[1]:
+            return None
+
+        return Snapshot(
+            np.load(os.path.join(path, 'records.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'messages.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'strings.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'offsets.npy'))
+        )
+
+    def writer(self, key):
+        """
+        Returns a SnapshotWriter that encodes a file's records as they
+        are parsed.
+        """
+        return SnapshotWriter(self, key)
+
+    def save(self, key, records, date_window):
+        """
+        Write a file's records, replacing older snapshots of the same file.
+        """
+        writer = self.writer(key)
+        writer.add(records)
+        writer.save(date_window)
+
+class SnapshotWriter(object):
+    """
+    Encodes one file's records into snapshot columns a chunk at a time,
+    so only the packed columns and string table are held until the
+    snapshot is saved, not the parsed records.
+    """
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+
+        self.strings = {}
+        self.columns = []
+        self.messages = []
+        self.records = 0
+
+    def intern(self, value):
+        if value is None:
+            return -1
+
+        return self.strings.setdefault(value, len(self.strings))
+
+    def add(self, records):
+        """
+        Encode a chunk of records.
+        """
+        intern = self.intern
+        columns = np.zeros(len(records), dtype=self.cache.RECORD_DTYPE)
+
+        for i, record in enumerate(records):
+            lobbyist = record.get('lobbyist', (None, None))
+
+            columns[i] = (
+                record['line'],
+                record['ethics_id'] or 0,
+                record.get('amends', -1),
+                record['valid'],
+                record['report_period'].toordinal() if record['valid'] else 0,
+                record['event_date'].toordinal() if record['valid'] else 0,
+                record.get('cost', 0.0),
+                intern(lobbyist[0]),
+                intern(lobbyist[1]),
+                intern(record.get('group')),
+                intern(record.get('legislator')),
+                intern(record.get('recipient')),
+                intern(record.get('recipient_type')),
+                intern(record.get('category')),
+                intern(record.get('description')),
+                intern(record.get('principal'))
+            )
+
+            for level, code, msg in record['messages']:
+                self.messages.append((self.records + i, intern(level), intern(code), intern(msg)))
+
+        self.columns.append(columns)
+        self.records += len(records)
+
+    def save(self, date_window):
+        """
+        Write the snapshot, replacing older snapshots of the same file.
+        """
+        path = self.cache.path
+        key = self.key
+
+        columns = np.concatenate(self.columns) if self.columns else np.zeros(0, dtype=self.cache.RECORD_DTYPE)
+        table = [None] * len(self.strings)
+
+        for value, i in self.strings.items():
+            table[i] = value.encode('utf-8') if isinstance(value, unicode) else value
+
+        offsets = np.cumsum([0] + map(len, table), dtype=np.int64)
+
+        try:
+            os.makedirs(path)
+        except OSError:
+            pass
+
+        # Written under a temporary name and renamed into place
+        tmp_path = tempfile.mkdtemp(prefix='.%s.' % key, dir=path)
+
+        np.save(os.path.join(tmp_path, 'records.npy'), columns)
+        np.save(os.path.join(tmp_path, 'messages.npy'), np.array(self.messages, dtype=self.cache.MESSAGE_DTYPE))
+        np.save(os.path.join(tmp_path, 'strings.npy'), np.frombuffer(''.join(table), dtype=np.uint8))
+        np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'version': self.cache.VERSION,
+                'records': self.records,
+                'date_window': date_window
+            }, f)
+
+        prefix = key.rsplit('_', 1)[0]
+
+        for name in os.listdir(path):
+            if name.rsplit('_', 1)[0] == prefix:
+                shutil.rmtree(os.path.join(path, name))
+
+        os.rename(tmp_path, os.path.join(path, key))
+
+class Snapshot(object):
     """
-    Clear data from sqlite.
+    A loaded snapshot. Records are rebuilt one chunk at a time.
     """
-    for cls in [Group, Lobbyist, Legislator, Organization, Expenditure]:
-        try:
-            cls.drop_table()
-        except:
-            continue
+    def __init__(self, records, messages, strings, offsets):
+        self.records = records
+        self.messages = messages
+
+        self.strings = [strings[offsets[i]:offsets[i + 1]].tostring().decode('utf-8') for i in range(len(offsets) - 1)]
+
+    def __len__(self):
+        return len(self.records)
+
+    def string(self, i):
+        return self.strings[i] if i >= 0 else None
 
-def create_tables():
+    def chunks(self, size):
+        messages = {}
+
+        for i, level, code, msg in self.messages.tolist():
+            messages.setdefault(i, []).append((self.strings[level], self.strings[code], self.strings[msg]))
+
+        for start in range(0, len(self.records), size):
+            chunk = []
+
+            for i, row in enumerate(self.records[start:start + size].tolist(), start):
+                line, ethics_id, amends, valid, report_period, event_date, cost = row[:7]
+                lobbyist_first, lobbyist_last, group, legislator, recipient, recipient_type, category, description, principal = map(self.string, row[7:])
+
+                record = {
+                    'line': line,
+                    'messages': messages.get(i, []),
+                    'valid': valid,
+                    'ethics_id': ethics_id
+                }
+
+                if amends >= 0:
+                    record['amends'] = amends
+
+                if lobbyist_first is not None:
+                    record['lobbyist'] = (lobbyist_first, lobbyist_last)
+
+                if group is not None:
+                    record['group'] = group
+
+                if legislator is not None:
+                    record['legislator'] = legislator
+
+                if valid:
+                    record.update({
+                        'report_period': datetime.date.fromordinal(report_period),
+                        'recipient': recipient,
+                        'recipient_type': recipient_type,
+                        'event_date': datetime.date.fromordinal(event_date),
+                        'category': category,
+                        'description': description,
+                        'cost': cost,
+                        'principal': principal
+                    })
+
+                chunk.append(record)
+
+            yield chunk
+
+def parse_expenditure_file(task):
     """
-    Create database tables for each model.
+    Read and parse one (year, type) file. Runs in a worker process
+    during parallel loads; returns picklable results for the writer.
+
+    The whole file's chunks come back as one list, so each pending file
+    costs its parsed records in memory (about 2 KB a row, or 20 MB for a
+    year of 9,000 individual expenditures) in the worker and again in the
+    parent. parse_files keeps at most processes * 2 files pending.
     """
-    for cls in [Group, Lobbyist, Legislator, Organization, Expenditure]:
-        cls.create_table()
+    first_year, chunk_size, source, snapshots, year, expenditure_type = task
+
+    loader = LobbyLoader(first_year, chunk_size=chunk_size, source=source, snapshots=snapshots)
+    chunks = list(loader.parse_expenditures(year, expenditure_type))
+
+    # Only the counts are needed by the parent
+    loader.parse_date.cache.clear()
+
+    return chunks, loader.timer.totals(), loader.parse_date
 
 class LobbyLoader:
     """
@@ -189,84 +2004,78 @@ class LobbyLoader:
     SKIP_TYPES = ['Local Government Official', 'Public Official', 'Secretary of State', 'ATTORNEY GENERAL', 'STATE TREASURER', 'GOVERNOR', 'STATE AUDITOR', 'LIEUTENANT GOVERNOR', 'SECRETARY OF STATE', 'JUDGE', 'GOVERNOR ELECT', 'CHIEF JUSTICE']
     ERROR_DATE_MIN = datetime.date(2003, 1, 1)
     ERROR_DATE_MAX = datetime.datetime.today().date()
-    MO_GOV_DATA_TYPES = {
-        '1': 'individual',
-        '2': 'group',
-        '3': 'solicitation'
-    }
+    MO_GOV_DATA_TYPES = scraper.MO_GOV_DATA_TYPES
+    EXPENDITURE_TYPES = ['individual', 'solicitation', 'group']
 
     organization_name_lookup = {}
-    expenditures = []
-    amendments = {
-        'individual': [],
-        'group': [],
-        'solicitation': [],
-    }
     datemode = None
 
-    warnings = []
-    errors = []
-
     individual_rows = 0
     group_rows = 0
     amended_rows = 0
+    expenditures_written = 0
+    expenditures_replaced = 0
     lobbyists_created = 0
     legislators_created = 0
     organizations_created = 0
     groups_created = 0
 
-    def __init__(self, first_year=2004):
+    def __init__(self, first_year=2004, batch_size=BULK_INSERT_BATCH_SIZE, chunk_size=LOAD_CHUNK_SIZE, processes=1, incremental=False, source='csv', snapshots=True):
         self.first_year = first_year
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.incremental = incremental
+        self.source = source
 
         self.legislators_demographics_filename = 'data/legislator_demographics.csv'
         self.organization_name_lookup_filename = 'data/organization_name_lookup.csv'
-
-    def _format_log(self, msg, year=None, line=None):
-        if line:
-            msg = '%05i -- %s' % (line, msg)
-
-        if year:
-            msg = '%i -- %s' % (year, msg)
-        
-        return msg
-
-    def info(self, msg, year=None, line=None):
+        self.legislator_aliases_filename = 'data/legislator_aliases.csv'
+        self.amendments_report_filename = '%s/amendments.csv' % app_config.LOBBYING_DATA_PATH
+        self.organization_suggestions_filename = '%s/organization_suggestions.csv' % app_config.LOBBYING_DATA_PATH
+        self.profile_filename = '%s/load_profile.json' % app_config.LOBBYING_DATA_PATH
+        self.profile_history_filename = '%s/load_profiles.jsonl' % app_config.LOBBYING_DATA_PATH
+        self.diagnostics_filename = '%s/load.log' % app_config.LOBBYING_DATA_PATH
+
+        self.amendments = AmendmentIndex(assume_written=incremental)
+        self.upserted_ids = dict((expenditure_type, set()) for expenditure_type in self.EXPENDITURE_TYPES)
+        self.timer = StageTimer()
+        self.file_timer = StageTimer()
+        self.parse_date = DateParser()
+        self.manifest = Manifest()
+        self.diagnostics = Diagnostics(self.diagnostics_filename)
+        self.snapshots = SnapshotCache('%s/snapshots' % app_config.LOBBYING_DATA_PATH) if snapshots else None
+        self.date_window = None
+        self.unmatched_principals = {}
+
+        self.slugs = SlugRegistry()
+        self.lobbyists = IdentityMap(Lobbyist, ['first_name', 'last_name'], self.slugs)
+        self.groups = IdentityMap(Group, ['name'], self.slugs)
+        self.organizations = IdentityMap(Organization, ['name'], self.slugs)
+        self.legislators = IdentityMap(Legislator, ['ethics_name'], self.slugs)
+        self.identity_maps = [self.lobbyists, self.groups, self.organizations, self.legislators]
+
+        self.legislator_names = LegislatorIndex()
+        self.legislator_names.load_aliases(self.legislator_aliases_filename)
+
+    def info(self, code, msg, year=None, line=None):
         pass
 
-    def warn(self, msg, year=None, line=None):
-        self.warnings.append(self._format_log(msg, year, line))
-
-    def error(self, msg, year=None, line=None):
-        self.errors.append(self._format_log(msg, year, line))
-
-    def parse_date(self, d):
-        return parse(d).date()
-
-    def scrape_lobbying_data(self):
-        try:
-            os.mkdir(app_config.LOBBYING_DATA_PATH)
-        except OSError:
-            pass
-
-        mech = mechanize.Browser()
-
-        for year in range(self.first_year, datetime.datetime.today().year + 1):
-            print year
+    def warn(self, code, msg, year=None, line=None):
+        self.diagnostics.log('warn', code, msg, year, line)
 
-            for i, data_type in self.MO_GOV_DATA_TYPES.items():
-                print '\t', data_type
+    def error(self, code, msg, year=None, line=None):
+        self.diagnostics.log('error', code, msg, year, line)
 
-                mech.open('http://mec.mo.gov/EthicsWeb/Lobbying/Lob_ExpCSV.aspx')
-                mech.select_form(name='aspnetForm')
-
-                mech['ctl00$ContentPlaceHolder$ddYear'] = [str(year)]
-                mech['ctl00$ContentPlaceHolder$ddExpType'] = [i]
-
-                response = mech.submit(name="ctl00$ContentPlaceHolder$btnExport")
-
-                with open('%s/%s_%s.csv' % (app_config.LOBBYING_DATA_PATH, year, data_type), 'w') as f:
-                    f.write(response.read())
+    def scrape_lobbying_data(self, refresh=False, workers=4):
+        """
+        Download any exports that aren't already cached.
+        """
+        mec = scraper.MECScraper(app_config.LOBBYING_DATA_PATH, workers=workers, refresh=refresh)
+        results = mec.run(range(self.first_year, datetime.datetime.today().year + 1))
 
+        if results.get('failed'):
+            raise IOError('Failed to download %i exports: %s' % (len(results['failed']), results['failed']))
 
     def load_organization_name_lookup(self):
         """
@@ -288,32 +2097,25 @@ class LobbyLoader:
 
                 self.organization_name_lookup[ethics_name] = correct_name
 
-                try:
-                    Organization.get(Organization.name == correct_name)
-                except Organization.DoesNotExist:
-                    Organization.create(
-                        name=correct_name,
-                        category=category
-                    )
+                created, organization = self.organizations.get_or_create(
+                    name=correct_name,
+                    category=category
+                )
+
+                if created:
+                    self.organizations_created += 1
+
+        self.organizations.flush(self.batch_size)
 
     def load_lobbyist(self, first_name, last_name):
         """
         Get or create a lobbyist.
         """
-        try:
-            return False, Lobbyist.get(Lobbyist.first_name==first_name, Lobbyist.last_name==last_name)
-        except Lobbyist.DoesNotExist:
-            pass
-
-        lobbyist = Lobbyist(
+        return self.lobbyists.get_or_create(
             first_name=first_name,
             last_name=last_name
         )
 
-        lobbyist.save()
-
-        return True, lobbyist 
-
     def load_organization(self, name):
         """
         Get or create an organization.
@@ -324,27 +2126,44 @@ class LobbyLoader:
             if lookup:
                 name = lookup
         
-            return Organization.get(Organization.name==name)
+            return self.organizations.get(name)
         else:
             return None
 
+    def write_organization_suggestions(self, limit=3, min_score=0.3):
+        """
+        Write a CSV of likely lookup table matches for each principal
+        that wasn't in it, most frequent principals first. Returns the
+        number of principals written.
+        """
+        lookup = self.organization_name_lookup
+        # Ethics names first, so a match carries its lookup row
+        index = TrigramIndex(sorted(lookup) + sorted(v for v in lookup.values() if v))
+
+        principals = sorted(self.unmatched_principals.items(), key=lambda p: (-p[1], p[0]))
+        suggestions = index.search_many([principal for principal, count in principals], limit, min_score)
+
+        with open(self.organization_suggestions_filename, 'w') as f:
+            writer = csvkit.CSVKitWriter(f)
+            writer.writerow(['principal', 'expenditures', 'rank', 'suggestion', 'correct_name', 'score'])
+
+            for principal, count in principals:
+                for rank, (suggestion, score) in enumerate(suggestions[principal], 1):
+                    writer.writerow([principal, count, rank, suggestion, lookup.get(suggestion) or suggestion, '%.3f' % score])
+
+                if not suggestions[principal]:
+                    writer.writerow([principal, count, '', '', '', ''])
+
+        return len(principals)
+
     def load_group(self, name):
         """
         Get or create a group.
         """
-        try:
-            return False, Group.get(Group.name==name)
-        except Group.DoesNotExist:
-            pass
-
-        group = Group(
+        return self.groups.get_or_create(
             name=name
         )
 
-        group.save()
-
-        return True, group
-
     def load_legislators(self):
         """
         Load legislator demographics.
@@ -366,7 +2185,7 @@ class LobbyLoader:
 
             # Process vacant seats
             if row['last_name'].upper() == 'VACANT':
-                Legislator.create(
+                self.legislators.add(Legislator(
                     first_name='',
                     last_name='',
                     office=office,
@@ -378,7 +2197,7 @@ class LobbyLoader:
                     hometown='',
                     vacant=True,
                     photo_filename=''
-                )
+                ))
 
                 self.legislators_created += 1
 
@@ -387,21 +2206,21 @@ class LobbyLoader:
             office = row['office']
 
             if office not in VALID_OFFICES:
-                self.warn('Not a valid office: "%s"' % (office), year, i)
+                self.warn('invalid-office', 'Not a valid office: "%s"' % (office), year, i)
 
             party = row['party']
 
             if not party:
-                self.error( 'No party affiliation for "%s": "%s"' % (office, row['ethics_name']), year, i)
+                self.error('no-party', 'No party affiliation for "%s": "%s"' % (office, row['ethics_name']), year, i)
             elif party not in VALID_PARTIES:
-                self.warn('Unknown party name: "%s"' % (party), year, i)
+                self.warn('unknown-party', 'Unknown party name: "%s"' % (party), year, i)
 
             year_elected = row['year_elected']
 
             if year_elected:
                 year_elected = int(year_elected)
             else:
-                self.error('No year elected for "%s": "%s"' % (office, row['ethics_name']), year, i)
+                self.error('no-year-elected', 'No year elected for "%s": "%s"' % (office, row['ethics_name']), year, i)
                 year_elected = None
 
             legislator = Legislator(
@@ -418,335 +2237,738 @@ class LobbyLoader:
                 photo_filename=row['photo']
             )
 
-            legislator.save()
+            self.legislators.add(legislator)
 
             if not os.path.exists('www/%s' % legislator.mugshot_url()):
-                self.error('No mugshot for legislator: %s' % legislator.display_name())
+                self.error('no-mugshot', 'No mugshot for legislator: %s' % legislator.display_name())
 
             self.legislators_created += 1
 
-    def load_individual_expenditures(self, year, rows, solicitations=False):
+        self.legislators.flush(self.batch_size)
+
+    def check_incremental(self):
         """
-        Load individual expenditures from files.
+        Decide whether an incremental load is possible. Changes to the
+        lookup tables affect rows from every year, so they (or a missing
+        manifest) require a full rebuild.
         """
-        i = 0
+        if not self.incremental:
+            return False
 
-        for row in rows:
-            i += 1
+        self.manifest.preload()
+
+        if not self.manifest.loaded:
+            print 'No manifest of loaded files, running a full load'
+            self.incremental = False
+        elif not all(cls.table_exists() for cls in MODELS):
+            print 'Database is missing tables, running a full load'
+            self.incremental = False
+        else:
+            for path in [self.organization_name_lookup_filename, self.legislators_demographics_filename, self.legislator_aliases_filename]:
+                if self.manifest.changed(path):
+                    print '%s has changed, running a full load' % path
+                    self.incremental = False
+
+        # A full load rebuilds the tables, manifest included
+        if not self.incremental:
+            self.manifest.loaded = {}
+
+        self.amendments.assume_written = self.incremental
+
+        return self.incremental
+
+    def years(self):
+        """
+        Years of data to load.
+        """
+        today = datetime.datetime.today()
+        years = range(self.first_year, today.year + 1)
+
+        # We're always two months behind, so we won't have current year data until March
+        if today.month < 3 and years and years[-1] == today.year:
+            years.pop()
+
+        # The workbooks only cover the years that were archived
+        if self.source == 'xlsx':
+            years = [year for year in years if os.path.exists(self.expenditures_path(year))]
+
+        return years
+
+    def expenditures_path(self, year, expenditure_type=None):
+        if self.source == 'xlsx':
+            return '%s/%s.xlsx' % (EXPENDITURE_WORKBOOKS_PATH, year)
+
+        return '%s/%s_%s.csv' % (app_config.LOBBYING_DATA_PATH, year, expenditure_type)
 
-            stripped_row = {}
+    def read_rows(self, path):
+        """
+        Stream whitespace-stripped rows from a CSV file.
+        """
+        with open(path) as f:
+            for row in csvkit.CSVKitDictReader(f):
+                yield dict((k.strip(), v.strip()) for k, v in row.items())
+
+    def read_expenditure_rows(self, year, expenditure_type):
+        """
+        Stream one year's rows of an expenditure type from the configured source.
+        """
+        path = self.expenditures_path(year, expenditure_type)
+
+        if self.source == 'xlsx':
+            return read_workbook_rows(path, expenditure_type)
+
+        return self.read_rows(path)
+
+    def check_columns(self, rows):
+        """
+        Coerce the date and amount columns of a chunk of rows in one pass
+        each and run the range and sign checks as vector masks.
+
+        Returns a dict of plain lists, indexed like rows.
+        """
+        date_min = self.ERROR_DATE_MIN.toordinal()
+        date_max = self.ERROR_DATE_MAX.toordinal()
+
+        report_ordinals, report_periods = coerce_dates([row['Report'] for row in rows], self.parse_date)
+        event_ordinals, event_dates = coerce_dates([row['Date'] for row in rows], self.parse_date)
+        cents, cost_valid = coerce_currency([row['Amount'] for row in rows])
+
+        # Closest dates either side of the "too new" cutoff, for snapshots
+        ordinals = np.concatenate([report_ordinals, event_ordinals])
+        before = ordinals[(ordinals > 0) & (ordinals <= date_max)]
+        after = ordinals[ordinals > date_max]
+
+        if self.date_window:
+            if len(before):
+                self.date_window[0] = max(self.date_window[0], int(before.max()))
+
+            if len(after):
+                self.date_window[1] = min(self.date_window[1], int(after.min()))
+
+        columns = {
+            'report_period': report_periods,
+            'report_unparsed': report_ordinals == 0,
+            'report_too_old': (report_ordinals > 0) & (report_ordinals < date_min),
+            'report_too_new': report_ordinals > date_max,
+            'event_date': event_dates,
+            'event_unparsed': event_ordinals == 0,
+            'event_too_old': (event_ordinals > 0) & (event_ordinals < date_min),
+            'event_too_new': event_ordinals > date_max,
+            'cost': cents / 100.0,
+            'cost_invalid': ~cost_valid,
+            'cost_negative': cents < 0
+        }
+
+        return dict((k, v.tolist()) for k, v in columns.items())
+
+    def parse_individual_expenditures(self, year, rows, first_line=1, solicitations=False):
+        """
+        Parse and validate a chunk of individual or solicitation rows.
+
+        Returns one record per row. Records carry their own log messages
+        so they can be emitted in line order when the chunk is resolved.
+        """
+        records = []
+        columns = self.check_columns(rows)
+
+        for j, row in enumerate(rows):
+            i = first_line + j
+
+            record = {
+                'line': i,
+                'messages': [],
+                'valid': False
+            }
 
-            # Strip whitespace
-            for k, v in row.items():
-                stripped_row[k.strip()] = v.strip()
+            records.append(record)
 
-            row = stripped_row
+            def log(level, code, msg):
+                record['messages'].append((level, code, msg))
+
+            ethics_id = row['Sol ID'] if solicitations else row['Indiv ID']
+            record['ethics_id'] = parse_ethics_id(ethics_id)
+
+            if record['ethics_id'] is None:
+                log('error', 'invalid-ethics-id', 'Skipping: invalid ethics ID, "%s"' % (ethics_id))
+                continue
 
             # Amended?
             amended = (row['Amend Sol ID'] if solicitations else row['Amend Indv ID'])
 
             if (amended) != '0':
-                if solicitations:
-                    t = 'solicitation'
+                amends = parse_ethics_id(amended)
+
+                if amends is None:
+                    log('error', 'invalid-amendment-id', 'Skipping: invalid amended ID, "%s"' % (amended))
                 else:
-                    t = 'individual'
+                    record['amends'] = amends
 
-                self.amendments[t].append(int(amended))
-                self.amended_rows += 1
                 continue
 
             # Lobbyist
-            created, lobbyist = self.load_lobbyist(row['Lob F Name'], row['Lob L Name'])
-
-            if created:
-                self.lobbyists_created += 1 
+            record['lobbyist'] = (row['Lob F Name'], row['Lob L Name'])
 
             # Report period
             if not row['Report']:
-                self.warn('Skipping row with no report date!', year, i)
+                log('warn', 'no-report-date', 'Skipping row with no report date!')
                 continue
 
-            report_period = self.parse_date(row['Report'])
+            report_period = columns['report_period'][j]
 
-            if report_period < self.ERROR_DATE_MIN:
-                self.warn('Skipping: report date too old, %s' % (report_period), year, i)
+            if columns['report_unparsed'][j]:
+                log('warn', 'report-date-unrecognized', 'Skipping: unrecognized report date, "%s"' % (row['Report']))
                 continue
-            elif report_period > self.ERROR_DATE_MAX:
-                self.warn('Skipping: report date too new, %s' % (report_period), year, i)
+            elif columns['report_too_old'][j]:
+                log('warn', 'report-date-too-old', 'Skipping: report date too old, %s' % (report_period))
+                continue
+            elif columns['report_too_new'][j]:
+                log('warn', 'report-date-too-new', 'Skipping: report date too new, %s' % (report_period))
                 continue
 
             # Recipient
-            try:
-                recipient, recipient_type = map(unicode.strip, row['Recipient'].rsplit(' - ', 1))
-            except ValueError:
-                self.warn('Skipping "%s", no recipient type' % (recipient), year, i)
+            recipient = self.legislator_names.split(row['Recipient'])
+
+            if not recipient:
+                log('warn', 'no-recipient-type', 'Skipping "%s", no recipient type' % (row['Recipient']))
                 continue
 
-            # NB: Brute force correction for name mispelling in one state dropdown
-            if recipient == 'CARPENTER, JOHN':
-                recipient = 'CARPENTER, JON'
+            recipient, recipient_type = recipient
 
             # Legislator
-            legislator = None
-
             if recipient_type in ['Senator', 'Representative']:
-                try:
-                    legislator = Legislator.get(Legislator.ethics_name==recipient)
-                except Legislator.DoesNotExist:
-                    self.info('Not a current legislator: %s %s' % (recipient_type, recipient), year, i)
+                record['legislator'] = recipient
             elif recipient_type in ['Employee or Staff', 'Spouse or Child']:
-                try:
-                    legislator_name, legislator_type = map(unicode.strip, row['Pub Official'].rsplit(' - ', 1))
-                except ValueError:
-                    self.warn('Skipping "%s", no recipient type' % (row['Pub Official']), year, i)
+                official = self.legislator_names.split(row['Pub Official'])
+
+                if not official:
+                    log('warn', 'no-recipient-type', 'Skipping "%s", no recipient type' % (row['Pub Official']))
                     continue
 
-                # NB: Brute force correction for name mispelling in one state dropdown
-                if legislator_name == 'CARPENTER, JOHN':
-                    legislator_name = 'CARPENTER, JON'
+                legislator_name, legislator_type = official
 
                 if legislator_type in self.SKIP_TYPES:
-                    self.info('Skipping "%s": "%s" for "%s": "%s"' % (recipient_type, recipient, legislator_type, legislator_name), line=i)
+                    log('info', 'skipped-official', 'Skipping "%s": "%s" for "%s": "%s"' % (recipient_type, recipient, legislator_type, legislator_name))
                     continue
 
-                try:
-                    legislator = Legislator.get(Legislator.ethics_name==legislator_name)
-                except Legislator.DoesNotExist:
-                    self.info('Not a current legislator: %s %s' % (legislator_type, legislator_name), year, i)
+                record['legislator'] = legislator_name
             elif recipient_type in self.SKIP_TYPES:
-                self.info('Skipping "%s": "%s"' % (recipient_type, recipient), line=i)
+                log('info', 'skipped-recipient-type', 'Skipping "%s": "%s"' % (recipient_type, recipient))
                 continue
             else:
-                self.error('Unknown recipient type, "%s": "%s"' % (recipient_type, recipient), year, i)
+                log('error', 'unknown-recipient-type', 'Unknown recipient type, "%s": "%s"' % (recipient_type, recipient))
                 continue
 
             # Event date
-            event_date = self.parse_date(row['Date'])
+            event_date = columns['event_date'][j]
 
-            if event_date < self.ERROR_DATE_MIN:
-                self.warn('Skipping, event date too old: %s' % (event_date), year, i)
+            if columns['event_unparsed'][j]:
+                log('warn', 'event-date-unrecognized', 'Skipping, unrecognized event date: "%s"' % (row['Date']))
+                continue
+            elif columns['event_too_old'][j]:
+                log('warn', 'event-date-too-old', 'Skipping, event date too old: %s' % (event_date))
                 continue
-            elif event_date > self.ERROR_DATE_MAX:
-                self.warn('Skipping, event date too new: %s' % (event_date), year, i)
+            elif columns['event_too_new'][j]:
+                log('warn', 'event-date-too-new', 'Skipping, event date too new: %s' % (event_date))
                 continue
 
             # Cost
-            cost = row['Amount']
+            cost = columns['cost'][j]
 
-            if cost < 0:
-                self.error('Negative cost outside an amendment!' % i, year, i)
+            if columns['cost_invalid'][j]:
+                log('error', 'invalid-cost', 'Invalid cost: "%s"' % (row['Amount']))
                 continue
-
-            # Organization
-            org_name = row['Principal']
-
-            if org_name == '':
-                self.warn('Skipping row with no organization name', year, i)
-
+            elif columns['cost_negative'][j]:
+                log('error', 'negative-cost', 'Negative cost outside an amendment!')
                 continue
 
-            organization = self.load_organization(org_name)
-
-            if not organization:
-                self.error('Organization name "%s" not in lookup table' % org_name, year, i)
+            # Organization
+            if row['Principal'] == '':
+                log('warn', 'no-organization', 'Skipping row with no organization name')
                 continue
 
-            # Create it!
-            self.expenditures.append(Expenditure(
-                lobbyist=lobbyist,
-                report_period=report_period,
-                recipient=recipient,
-                recipient_type=recipient_type,
-                legislator=legislator,
-                event_date=event_date,
-                category=row['Type'],
-                description=row['Description'],
-                cost=cost,
-                organization=organization,
-                group=None,
-                ethics_id=int(row['Sol ID'] if solicitations else row['Indiv ID']),
-                is_solicitation=solicitations
-            ))
-
-        self.individual_rows += i 
-
-    def load_group_expenditures(self, year, rows):
+            record.update({
+                'valid': True,
+                'report_period': report_period,
+                'recipient': recipient,
+                'recipient_type': recipient_type,
+                'event_date': event_date,
+                'category': row['Type'],
+                'description': row['Description'],
+                'cost': cost,
+                'principal': row['Principal']
+            })
+
+        return records
+
+    def parse_group_expenditures(self, year, rows, first_line=1):
         """
-        Load group expenditures from files.
+        Parse and validate a chunk of group rows.
         """
-        i = 0
+        records = []
+        columns = self.check_columns(rows)
 
-        for row in rows:
-            i += 1
+        for j, row in enumerate(rows):
+            i = first_line + j
+
+            record = {
+                'line': i,
+                'messages': [],
+                'valid': False
+            }
+
+            records.append(record)
 
-            stripped_row = {}
+            def log(level, code, msg):
+                record['messages'].append((level, code, msg))
 
-            # Strip whitespace
-            for k, v in row.items():
-                stripped_row[k.strip()] = v.strip()
+            record['ethics_id'] = parse_ethics_id(row['Grp ID'])
 
-            row = stripped_row
+            if record['ethics_id'] is None:
+                log('error', 'invalid-ethics-id', 'Skipping: invalid ethics ID, "%s"' % (row['Grp ID']))
+                continue
 
             # Amended?
             if row['Amend Grp ID'] != '0':
-                self.amendments['group'].append(int(row['Amend Grp ID']))
-                self.amended_rows += 1
+                amends = parse_ethics_id(row['Amend Grp ID'])
+
+                if amends is None:
+                    log('error', 'invalid-amendment-id', 'Skipping: invalid amended ID, "%s"' % (row['Amend Grp ID']))
+                else:
+                    record['amends'] = amends
+
                 continue
 
             # Lobbyist
-            created, lobbyist = self.load_lobbyist(row['Lob F Name'], row['Lob L Name'])
-
-            if created:
-                self.lobbyists_created += 1 
+            record['lobbyist'] = (row['Lob F Name'], row['Lob L Name'])
 
             # Report period
-            report_period = self.parse_date(row['Report'])
+            report_period = columns['report_period'][j]
 
-            if report_period < self.ERROR_DATE_MIN:
-                self.warn('Skipping, report date too old: %s' % (report_period), year, i)
+            if columns['report_unparsed'][j]:
+                log('warn', 'report-date-unrecognized', 'Skipping, unrecognized report date: "%s"' % (row['Report']))
                 continue
-            elif report_period > self.ERROR_DATE_MAX:
-                self.warn('Skipping, report date too new: %s' % (report_period), year, i)
+            elif columns['report_too_old'][j]:
+                log('warn', 'report-date-too-old', 'Skipping, report date too old: %s' % (report_period))
+                continue
+            elif columns['report_too_new'][j]:
+                log('warn', 'report-date-too-new', 'Skipping, report date too new: %s' % (report_period))
                 continue
 
             # Group
-            created, group = self.load_group(row['Group'])
-
-            if created:
-                self.groups_created += 1
+            record['group'] = row['Group']
 
             # Event date
-            event_date = self.parse_date(row['Date'])
+            event_date = columns['event_date'][j]
 
-            if event_date < self.ERROR_DATE_MIN:
-                self.warn('Skipping, event date too old: %s' % (event_date), year, i)
+            if columns['event_unparsed'][j]:
+                log('warn', 'event-date-unrecognized', 'Skipping, unrecognized event date: "%s"' % (row['Date']))
                 continue
-            elif event_date > self.ERROR_DATE_MAX:
-                self.warn('Skipping, event date too new: %s' % (event_date), year, i)
+            elif columns['event_too_old'][j]:
+                log('warn', 'event-date-too-old', 'Skipping, event date too old: %s' % (event_date))
+                continue
+            elif columns['event_too_new'][j]:
+                log('warn', 'event-date-too-new', 'Skipping, event date too new: %s' % (event_date))
                 continue
 
             # Cost
-            cost = row['Amount']
+            cost = columns['cost'][j]
 
-            if cost < 0:
-                self.error('Negative cost outside an amendment!' % i, year, i)
+            if columns['cost_invalid'][j]:
+                log('error', 'invalid-cost', 'Invalid cost: "%s"' % (row['Amount']))
+                continue
+            elif columns['cost_negative'][j]:
+                log('error', 'negative-cost', 'Negative cost outside an amendment!')
                 continue
 
-            # Organization
-            organization = self.load_organization(row['Principal'])
+            record.update({
+                'valid': True,
+                'report_period': report_period,
+                'recipient': '',
+                'recipient_type': '',
+                'event_date': event_date,
+                'category': row['Type'],
+                'description': row['Description'],
+                'cost': cost,
+                'principal': row['Principal']
+            })
+
+        return records
+
+    def resolve_expenditures(self, year, expenditure_type, records):
+        """
+        Emit record messages, resolve related entities and stage
+        expenditures in the amendment index.
+        """
+        for record in records:
+            i = record['line']
+
+            for level, code, msg in record['messages']:
+                getattr(self, level)(code, msg, year, i)
+
+            if 'amends' in record:
+                self.amendments.amend(expenditure_type, record['amends'], record['ethics_id'])
+                self.amended_rows += 1
+                continue
+
+            lobbyist = None
+            group = None
+            legislator = None
+
+            if 'lobbyist' in record:
+                created, lobbyist = self.load_lobbyist(*record['lobbyist'])
+
+                if created:
+                    self.lobbyists_created += 1
+
+            if 'group' in record:
+                created, group = self.load_group(record['group'])
+
+                if created:
+                    self.groups_created += 1
+
+            if 'legislator' in record:
+                legislator = self.legislator_names.get(record['legislator'])
+
+                if not legislator:
+                    self.info('not-a-legislator', 'Not a current legislator: %s' % record['legislator'], year, i)
+
+            if not record['valid']:
+                continue
+
+            organization = self.load_organization(record['principal'])
 
             if not organization:
-                self.error('Organization name "%s" not in lookup table' % row['Principal'], year, i)
+                self.unmatched_principals[record['principal']] = self.unmatched_principals.get(record['principal'], 0) + 1
+                self.error('organization-not-in-lookup', 'Organization name "%s" not in lookup table' % record['principal'], year, i)
                 continue
 
-            # Create it!
-            self.expenditures.append(Expenditure(
+            self.amendments.stage(expenditure_type, Expenditure(
                 lobbyist=lobbyist,
-                report_period=report_period,
-                recipient='',
-                recipient_type='',
-                legislator=None,
-                event_date=event_date,
-                category=row['Type'],
-                description=row['Description'],
-                cost=cost,
+                report_period=record['report_period'],
+                recipient=self.legislator_names.correct(record['recipient']),
+                recipient_type=record['recipient_type'],
+                legislator=legislator,
+                event_date=record['event_date'],
+                category=record['category'],
+                description=record['description'],
+                cost=record['cost'],
                 organization=organization,
                 group=group,
-                ethics_id=int(row['Grp ID']),
-                is_solicitation=False
+                ethics_id=record['ethics_id'],
+                is_solicitation=(expenditure_type == 'solicitation')
             ))
 
-        self.group_rows += i
+    def write_expenditures(self):
+        """
+        Write staged expenditures and delete any previously written
+        rows that have since been amended.
+        """
+        self.lobbyists.flush(self.batch_size)
+        self.groups.flush(self.batch_size)
+
+        staged = self.amendments.drain()
+
+        # Upsert on (ethics id, type) when loading into an existing database.
+        # Rows can share an ethics id across chunks, so each id's old rows
+        # are deleted only the first time this run writes it.
+        if self.incremental:
+            for expenditure_type, expenditures in staged.items():
+                ethics_ids = set(e.ethics_id for e in expenditures) - self.upserted_ids[expenditure_type]
+
+                if ethics_ids:
+                    self.expenditures_replaced += delete_expenditures(expenditure_type, ethics_ids)
+                    self.upserted_ids[expenditure_type].update(ethics_ids)
+
+        written = bulk_insert(Expenditure, (e for t in self.amendments.TYPES for e in staged[t]), self.batch_size)
+        self.expenditures_written += written
+
+        for expenditure_type, ethics_ids in self.amendments.drain_superseded():
+            deleted = delete_expenditures(expenditure_type, ethics_ids)
+
+            self.amendments.removed += deleted
+            self.expenditures_written -= deleted
+
+        return written
+
+    def parse_expenditures(self, year, expenditure_type):
+        """
+        Read and parse one year's file of expenditures, yielding
+        chunks of records.
+
+        Files that were parsed before are read back from a snapshot.
+        """
+        if self.snapshots:
+            path = self.expenditures_path(year, expenditure_type)
+            key = self.snapshots.key(self.source, year, expenditure_type, file_checksum(path))
+
+            snapshot = self.snapshots.load(key, self.ERROR_DATE_MAX)
+
+            if snapshot is not None:
+                for chunk in self.timer.timed('snapshot read', snapshot.chunks(self.chunk_size)):
+                    yield chunk
+
+                return
+
+            writer = self.snapshots.writer(key)
+
+        rows = self.read_expenditure_rows(year, expenditure_type)
+        line = 1
+
+        self.date_window = [0, datetime.date.max.toordinal() + 1]
+
+        for chunk in self.timer.timed('read', chunked(rows, self.chunk_size)):
+            with self.timer.time('parse', len(chunk)):
+                if expenditure_type == 'group':
+                    records = self.parse_group_expenditures(year, chunk, line)
+                else:
+                    records = self.parse_individual_expenditures(year, chunk, line, expenditure_type == 'solicitation')
+
+            line += len(chunk)
+
+            if self.snapshots:
+                with self.timer.time('snapshot write', len(records)):
+                    writer.add(records)
+
+            yield records
+
+        if self.snapshots:
+            with self.timer.time('snapshot write'):
+                writer.save(self.date_window)
+
+        self.date_window = None
+
+    def parse_files(self, files):
+        """
+        Parse each (year, type) file, yielding an iterable of record
+        chunks per file, in order.
+
+        With more than one process, files are parsed in a worker pool
+        a few at a time while the main process resolves and writes.
+        """
+        if self.processes == 1:
+            for year, expenditure_type in files:
+                yield self.parse_expenditures(year, expenditure_type)
+
+            return
+
+        pool = multiprocessing.Pool(self.processes)
+        pending = deque()
+        files = iter(files)
+
+        def submit():
+            for year, expenditure_type in files:
+                task = (self.first_year, self.chunk_size, self.source, self.snapshots is not None, year, expenditure_type)
+                pending.append(pool.apply_async(parse_expenditure_file, (task,)))
+
+                return
+
+        try:
+            # Keep the pool busy without buffering every year's records
+            for i in range(self.processes * 2):
+                submit()
+
+            while pending:
+                chunks, totals, parse_date = pending.popleft().get()
+                submit()
+
+                for total in totals:
+                    self.timer.add(*total)
+
+                self.parse_date.merge(parse_date)
+
+                yield chunks
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def load_expenditures(self, year, expenditure_type, chunks):
+        """
+        Resolve and write one file's chunks of records.
+        """
+        rows = 0
+
+        for records in chunks:
+            with self.timer.time('resolve', len(records)):
+                self.resolve_expenditures(year, expenditure_type, records)
+
+            with self.timer.time('write') as stage:
+                stage.rows = self.write_expenditures()
+
+            rows += len(records)
+
+        if expenditure_type == 'group':
+            self.group_rows += rows
+        else:
+            self.individual_rows += rows
+
+        return rows
+
+    def write_profile(self, started, wall_seconds, cpu_seconds):
+        """
+        Write the stage and per-file measurements as JSON, and append
+        them to a history file so loads can be compared over time.
+        """
+        files = []
+
+        for name, stage in self.file_timer.items():
+            year, expenditure_type = name.split()
+
+            profile = stage.as_dict()
+            profile.update({
+                'year': int(year),
+                'type': expenditure_type
+            })
+
+            files.append(profile)
+
+        stages = []
+
+        for name, stage in self.timer.items():
+            profile = stage.as_dict()
+            profile['name'] = name
+
+            stages.append(profile)
+
+        profile = {
+            'started': started.isoformat(),
+            'first_year': self.first_year,
+            'processes': self.processes,
+            'incremental': self.incremental,
+            'wall_seconds': round(wall_seconds, 4),
+            'cpu_seconds': round(cpu_seconds, 4),
+            'peak_rss_kb': resource_usage()[1],
+            'individual_rows': self.individual_rows,
+            'group_rows': self.group_rows,
+            'expenditures_written': self.expenditures_written,
+            'warnings': self.diagnostics.count('warn'),
+            'errors': self.diagnostics.count('error'),
+            'diagnostics': self.diagnostics.summary(),
+            'stages': stages,
+            'files': files
+        }
+
+        with open(self.profile_filename, 'w') as f:
+            json.dump(profile, f, indent=4, sort_keys=True)
+
+        with open(self.profile_history_filename, 'a') as f:
+            f.write(json.dumps(profile, sort_keys=True) + '\n')
 
     def run(self):
         """
         Run the loader and output summary.
         """
+        started = datetime.datetime.now()
+        start = time.time()
+        start_cpu = resource_usage()[0]
+
+        for identity_map in self.identity_maps:
+            identity_map.preload()
+
         print 'Loading organization names'
         self.load_organization_name_lookup()
 
-        print 'Loading legislator demographics'
-        self.load_legislators()
+        if self.incremental:
+            self.amendments.preload()
+        else:
+            print 'Loading legislator demographics'
+            self.load_legislators()
+
+        for legislator in self.legislators.instances.values():
+            self.legislator_names.add(legislator)
+
+        self.manifest.record(self.organization_name_lookup_filename)
+        self.manifest.record(self.legislators_demographics_filename)
+        self.manifest.record(self.legislator_aliases_filename)
 
         print ''
 
-        for year in range(self.first_year, datetime.datetime.today().year + 1):
-            # We're always two months behind, so we won't have current year data until March
-            if year == datetime.datetime.today().year:
-                if datetime.datetime.today().month < 3:
-                    continue
+        files = [(year, expenditure_type) for year in self.years() for expenditure_type in self.EXPENDITURE_TYPES]
 
-            print year
-            print '----'
-            print ''
+        if self.incremental:
+            changed = [f for f in files if self.manifest.changed(self.expenditures_path(*f))]
 
-            print 'Loading individual expenditures'
-            path = '%s/%s_individual.csv' % (app_config.LOBBYING_DATA_PATH, year)
+            print 'Incremental load: %i of %i files changed' % (len(changed), len(files))
+            print ''
 
-            with open(path) as f:
-                table = list(csvkit.CSVKitDictReader(f))
+            files = changed
 
-            self.load_individual_expenditures(year, table, False)
+        current_year = None
 
-            print 'Loading solicitation expenditures'
-            path = '%s/%s_solicitation.csv' % (app_config.LOBBYING_DATA_PATH, year)
+        for (year, expenditure_type), chunks in zip(files, self.parse_files(files)):
+            if year != current_year:
+                if current_year:
+                    print ''
 
-            with open(path) as f:
-                table = list(csvkit.CSVKitDictReader(f))
+                print year
+                print '----'
+                print ''
 
-            self.load_individual_expenditures(year, table, True)
+                current_year = year
 
-            print 'Loading group expenditures'
-            path = '%s/%s_group.csv' % (app_config.LOBBYING_DATA_PATH, year)
+            print 'Loading %s expenditures' % expenditure_type
 
-            with open(path) as f:
-                table = list(csvkit.CSVKitDictReader(f))
+            with self.file_timer.time('%i %s' % (year, expenditure_type)) as stage:
+                stage.rows = self.load_expenditures(year, expenditure_type, chunks)
 
-            self.load_group_expenditures(year, table)
+            self.manifest.record(self.expenditures_path(year, expenditure_type))
 
+        if current_year:
             print ''
 
-        if self.warnings:
+        with self.timer.time('rollups') as stage:
+            stage.rows = build_rollups()
+
+        with self.timer.time('dataset version') as stage:
+            dataset = Dataset.record()
+            stage.rows = dataset.expenditures
+
+        self.diagnostics.close()
+
+        if self.diagnostics.count('warn'):
             print 'WARNINGS'
             print '--------'
 
-            for warning in self.warnings:
-                print warning
-
+            self.diagnostics.report('warn')
             print ''
 
-        if self.errors:
+        if self.diagnostics.count('error'):
             print 'ERRORS'
             print '------'
 
-            for error in self.errors:
-                print error
-
+            self.diagnostics.report('error')
             print ''
 
-            # return
+        print 'Wrote all warnings and errors to %s' % self.diagnostics_filename
 
-        print 'Removing %i amended IDs' % self.amended_rows
+        print 'Skipped %i amended rows' % self.amended_rows
+        print 'Removed %i superseded rows' % self.amendments.removed
 
-        removed = 0
+        self.amendments.save(self.batch_size)
+        self.amendments.write_report(self.amendments_report_filename)
+        print 'Wrote amendment report to %s' % self.amendments_report_filename
 
-        for expenditure in self.expenditures:
-            if expenditure.is_solicitation:
-                if expenditure.ethics_id in self.amendments['solicitation']:
-                    removed += 1
-                    continue
-            elif expenditure.group:
-                if expenditure.ethics_id in self.amendments['group']:
-                    removed += 1
-                    continue
-            else:
-                if expenditure.ethics_id in self.amendments['individual']:
-                    removed += 1
-                    continue
+        # Keep the last run's suggestions if nothing was parsed
+        if files:
+            with self.timer.time('organization suggestions') as stage:
+                stage.rows = self.write_organization_suggestions()
+
+            print 'Wrote suggestions for %i unmatched organization names to %s' % (stage.rows, self.organization_suggestions_filename)
+        print ''
+
+        print 'STAGES'
+        print '------'
+
+        self.timer.report()
+        print ''
+
+        print 'FILES'
+        print '-----'
 
-            expenditure.save()
+        self.file_timer.report()
+        print ''
 
-        print 'Removed %i rows' % removed
+        self.write_profile(started, time.time() - start, resource_usage()[0] - start_cpu)
+        print 'Wrote load profile to %s' % self.profile_filename
         print ''
 
         print 'SUMMARY'
@@ -755,9 +2977,26 @@ class LobbyLoader:
         print 'Processed %i individual rows' % self.individual_rows
         print 'Processed %i group rows' % self.group_rows 
         print ''
-        print 'Encountered %i warnings' % len(self.warnings)
-        print 'Encountered %i errors' % len(self.errors)
+        print 'Encountered %i warnings' % self.diagnostics.count('warn')
+        print 'Encountered %i errors' % self.diagnostics.count('error')
         print ''
-        print 'Imported %i expenditures' % len(self.expenditures)
+        print 'Imported %i expenditures' % self.expenditures_written
+
+        if self.incremental:
+            print 'Replaced %i existing expenditures' % self.expenditures_replaced
+
         print 'Created %i lobbyists' % self.lobbyists_created
         print 'Created %i legislators' % self.legislators_created
+        print ''
+
+        # Legislators are resolved through the name index instead
+        for identity_map in [self.lobbyists, self.groups, self.organizations]:
+            print '%s lookups: %i hits, %i misses (%i cached)' % (identity_map.model_class.__name__, identity_map.hits, identity_map.misses, len(identity_map))
+
+        legislator_names = self.legislator_names
+        print 'Legislator lookups: %i hits (%i through aliases), %i misses' % (legislator_names.hits, legislator_names.alias_hits, legislator_names.misses)
+
+        print 'Date lookups: %i hits, %i misses' % (self.parse_date.hits, self.parse_date.misses)
+
+        for shape, count in sorted(self.parse_date.fallbacks.items()):
+            print 'Unrecognized date format "%s": %i' % (shape, count)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+Download lobbying expenditure exports from the Missouri Ethics Commission.
+"""
+
+import datetime
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse
+
+import mechanize
+
+MEC_EXPORT_URL = 'http://mec.mo.gov/EthicsWeb/Lobbying/Lob_ExpCSV.aspx'
+
+MO_GOV_DATA_TYPES = {
+    '1': 'individual',
+    '2': 'group',
+    '3': 'solicitation'
+}
+
+class HostLimiter(object):
+    """
+    Politeness limit: at most max_concurrent requests in flight to a
+    host, started at least delay seconds apart.
+    """
+    def __init__(self, max_concurrent=2, delay=0.5):
+        self.max_concurrent = max_concurrent
+        self.delay = delay
+
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.last_request = {}
+
+    def acquire(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.max_concurrent)
+
+            semaphore = self.semaphores[host]
+
+        semaphore.acquire()
+
+        # Reserve the next start slot for this host
+        with self.lock:
+            now = time.time()
+            start = max(now, self.last_request.get(host, 0) + self.delay)
+            self.last_request[host] = start
+
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self.semaphores[host].release()
+
+class MECScraper(object):
+    """
+    Concurrent, cached and resumable downloader for MEC exports.
+
+    Each (year, type) export is written to a temporary file and renamed
+    into place, so an interrupted run never leaves a partial CSV behind
+    and a rerun picks up where it stopped. Past years that are already
+    on disk are skipped unless refresh is set.
+    """
+    def __init__(self, output_path, url=MEC_EXPORT_URL, workers=4, per_host=2, delay=0.5, retries=3, backoff=2.0, refresh=False, timeout=120):
+        self.output_path = output_path
+        self.url = url
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.refresh = refresh
+        self.timeout = timeout
+
+        self.limiter = HostLimiter(per_host, delay)
+        self.host = urlparse(url).netloc
+
+    def path(self, year, data_type):
+        return '%s/%s_%s.csv' % (self.output_path, year, data_type)
+
+    def is_cached(self, year, data_type):
+        """
+        The current year's export changes monthly, so it is never cached.
+        """
+        if self.refresh or year >= datetime.date.today().year:
+            return False
+
+        return os.path.exists(self.path(year, data_type))
+
+    def fetch(self, year, type_code, f):
+        """
+        Submit the export form and stream the response to a file.
+        """
+        self.limiter.acquire(self.host)
+
+        try:
+            mech = mechanize.Browser()
+            mech.set_handle_robots(False)
+
+            mech.open(self.url, timeout=self.timeout)
+            mech.select_form(name='aspnetForm')
+
+            mech['ctl00$ContentPlaceHolder$ddYear'] = [str(year)]
+            mech['ctl00$ContentPlaceHolder$ddExpType'] = [type_code]
+
+            response = mech.submit(name='ctl00$ContentPlaceHolder$btnExport')
+
+            for block in iter(lambda: response.read(1 << 16), ''):
+                f.write(block)
+        finally:
+            self.limiter.release(self.host)
+
+    def download(self, task):
+        """
+        Download one export with retries, writing it atomically.
+        Returns (year, data_type, status).
+        """
+        year, type_code = task
+        data_type = MO_GOV_DATA_TYPES[type_code]
+
+        if self.is_cached(year, data_type):
+            return year, data_type, 'cached'
+
+        for attempt in range(self.retries + 1):
+            fd, tmp_path = tempfile.mkstemp(prefix='.%s_%s.' % (year, data_type), dir=self.output_path)
+
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    self.fetch(year, type_code, f)
+
+                # mkstemp files are owner-only; match the files urllib wrote
+                os.chmod(tmp_path, 0644)
+                os.rename(tmp_path, self.path(year, data_type))
+
+                return year, data_type, 'downloaded'
+            except Exception, e:
+                os.remove(tmp_path)
+
+                if attempt == self.retries:
+                    print 'Failed %s %s: %s' % (year, data_type, e)
+
+                    return year, data_type, 'failed'
+
+                wait = self.backoff * (2 ** attempt)
+                print 'Retrying %s %s in %.1fs: %s' % (year, data_type, wait, e)
+                time.sleep(wait)
+
+    def run(self, years):
+        """
+        Download every export for the given years.
+        Returns a dict of status -> list of (year, data_type).
+        """
+        try:
+            os.makedirs(self.output_path)
+        except OSError:
+            pass
+
+        tasks = [(year, type_code) for year in years for type_code in sorted(MO_GOV_DATA_TYPES)]
+        results = {}
+
+        pool = ThreadPool(self.workers)
+
+        try:
+            for year, data_type, status in pool.imap_unordered(self.download, tasks):
+                print '%s %s: %s' % (year, data_type, status)
+                results.setdefault(status, []).append((year, data_type))
+        finally:
+            pool.close()
+            pool.join()
+
+        return results
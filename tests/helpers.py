@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import models
+
+class TempDirTestCase(unittest.TestCase):
+    """
+    Base class for tests that write files to a temporary directory.
+    """
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+class DatabaseTestCase(TempDirTestCase):
+    """
+    Base class for tests that need an empty database.
+    """
+    def setUp(self):
+        super(DatabaseTestCase, self).setUp()
+
+        models.database.init(os.path.join(self.tmp_path, 'test.sqlite'))
+        models.create_tables()
+
+    def tearDown(self):
+        models.database.close()
+        models.database.init('stl-lobbying.sqlite')
+
+        super(DatabaseTestCase, self).tearDown()
+
+def create_expenditure(lobbyist, organization, report_period=datetime.date(2013, 1, 1), cost=10.0, ethics_id=1, **kwargs):
+    """
+    Create an expenditure, filling in the fields tests don't look at.
+    """
+    return models.Expenditure.create(lobbyist=lobbyist, organization=organization, report_period=report_period, recipient='', recipient_type='',
+        event_date=report_period, category='Meals', description='Lunch', cost=cost, ethics_id=ethics_id, is_solicitation=False, **kwargs)
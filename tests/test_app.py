@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 
+import datetime
 import json
+import os
 import unittest
 
 import app
 import app_config
+import models
+from tests.helpers import DatabaseTestCase, create_expenditure
 
 class IndexTestCase(unittest.TestCase):
     """
@@ -19,6 +23,172 @@ class IndexTestCase(unittest.TestCase):
 
         assert app_config.PROJECT_NAME in response.data
 
+class ExpenditureTestCase(DatabaseTestCase):
+    """
+    Base class for tests that need a database of expenditures.
+    """
+    def add_organizations(self, count):
+        lobbyist = models.Lobbyist.create(first_name='Jane', last_name='Doe')
+
+        for i in range(count):
+            organization = models.Organization.create(name='Organization %i' % i, category='Utilities')
+
+            create_expenditure(lobbyist, organization, cost=10.0 * (i + 1), ethics_id=i)
+
+        models.build_rollups()
+
+class HomepageStatsTestCase(ExpenditureTestCase):
+    """
+    Test homepage statistics from the rollup tables.
+    """
+    def stats(self):
+        with models.QueryLog().capture() as log:
+            stats = app.homepage_stats(datetime.date(2012, 1, 1), limit=3)
+
+        return stats, len(log.queries)
+
+    def test_stats(self):
+        self.add_organizations(2)
+        stats, queries = self.stats()
+
+        assert stats['total_spending'] == 30.0
+        assert stats['total_expenditures'] == 2
+        assert stats['total_organizations'] == 2
+        assert stats['total_lobbyists'] == 1
+        assert [o.name for o in stats['organizations_total_spending']] == ['Organization 1', 'Organization 0']
+        assert stats['categories_total_spending'] == [('Utilities', 30.0)]
+
+        self.add_organizations(20)
+
+        assert self.stats()[1] == queries
+
+    def touch(self, mtime):
+        os.utime(models.database.database, (mtime, mtime))
+
+    def test_get_dataset(self):
+        # Set modification times explicitly, since loads can land within
+        # the filesystem's timestamp resolution
+        app.dataset_cache.clear()
+
+        self.add_organizations(1)
+        version = models.Dataset.record().version
+        self.touch(1000000000)
+
+        assert app.get_dataset().version == version
+
+        with models.QueryLog().capture() as log:
+            assert app.get_dataset().version == version
+
+        assert log.queries == []
+
+        self.add_organizations(1)
+        models.Dataset.record()
+        self.touch(1000000001)
+
+        assert app.get_dataset().version != version
+
+class QueryPlanTestCase(ExpenditureTestCase):
+    """
+    Test that page queries use the expenditure indexes.
+    """
+    def test_page_queries(self):
+        self.add_organizations(2)
+
+        ago = datetime.date(2012, 1, 1)
+        legislator = models.Legislator(id=1)
+        organization = models.Organization.get()
+
+        with models.QueryLog().capture() as log:
+            app.homepage_stats(ago)
+            models.RankIndex(ago)
+
+            list(legislator.top_organizations())
+            list(legislator.recent_expenditures(ago))
+            models.LegislatorMonth.spending(ago, legislator=legislator)
+
+            list(organization.top_legislators().limit(10))
+            list(organization.recent_expenditures(ago))
+            models.OrganizationMonth.spending(ago, organization=organization)
+
+        assert len(log.queries) == 15
+
+        for sql, params in log.queries:
+            assert models.full_table_scans(sql, params) == [], sql
+
+class DownloadTestCase(ExpenditureTestCase):
+    """
+    Test the streamed CSV download.
+    """
+    def test_generate_csv(self):
+        self.add_organizations(5)
+
+        with models.QueryLog().capture() as log:
+            chunks = list(app.generate_csv(models.Expenditure.select_related().order_by(models.Expenditure.id)))
+
+        assert len(log.queries) == 1
+
+        lines = ''.join(chunks).splitlines()
+
+        assert lines[0].startswith('lobbyist_first_name,lobbyist_last_name,')
+        assert lines[1].startswith('Jane,Doe,2013-01-01,')
+        assert len(lines) == 6
+
+        # The header goes out before any rows are read
+        assert chunks[0] == lines[0] + '\r\n'
+
+    def test_write_downloads(self):
+        self.add_organizations(3)
+
+        assert app.write_downloads(self.tmp_path) == 5
+
+        download_path = os.path.join(self.tmp_path, 'download')
+
+        with open(os.path.join(download_path, 'lobbyingmissouri.csv')) as f:
+            assert len(f.readlines()) == 4
+
+        with open(os.path.join(download_path, 'years', 'lobbyingmissouri-2013.csv')) as f:
+            assert len(f.readlines()) == 4
+
+        with open(os.path.join(download_path, 'organizations', 'lobbyingmissouri-organization-1.csv')) as f:
+            lines = f.readlines()
+
+        assert len(lines) == 2
+        assert ',Organization 1,' in lines[1]
+
+    def test_write_downloads_opens_each_file_once(self):
+        self.add_organizations(3)
+
+        opened = []
+
+        def counting_open(path, mode='r'):
+            opened.append(path)
+
+            return open(path, mode)
+
+        app.open = counting_open
+
+        try:
+            # Fewer open files than slices must not mean reopening them
+            files = app.write_downloads(self.tmp_path, max_open=2)
+        finally:
+            del app.open
+
+        assert files == 5
+        assert len(opened) == files
+
+    def test_csv_files(self):
+        files = app.CSVFiles(self.tmp_path, max_open=1)
+        row = dict((field, 'x') for field in app.CSV_FIELDS)
+
+        for url in ['/a.csv', '/b.csv', '/a.csv']:
+            files.writerow(url, row)
+
+        files.close()
+
+        # Reopened files are appended to, without a second header
+        with open(os.path.join(self.tmp_path, 'a.csv')) as f:
+            assert len(f.readlines()) == 3
+
 class AppConfigTestCase(unittest.TestCase):
     """
     Testing dynamic conversion of Python app_config into Javascript. 
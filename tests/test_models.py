@@ -0,0 +1,667 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import unittest
+
+import openpyxl
+
+import models
+from tests.helpers import DatabaseTestCase, TempDirTestCase, create_expenditure
+
+class BulkInsertTestCase(DatabaseTestCase):
+    """
+    Test multi-row inserts.
+    """
+    def test_bulk_insert(self):
+        groups = [models.Group(name='Group %i' % i, slug='group-%i' % i) for i in range(250)]
+
+        inserted = models.bulk_insert(models.Group, groups, batch_size=100)
+
+        assert inserted == 250
+        assert models.Group.select().count() == 250
+        assert models.Group.get(models.Group.slug == 'group-249').name == 'Group 249'
+
+class BulkLoadTestCase(DatabaseTestCase):
+    """
+    Test rebuilding in bulk-load mode.
+    """
+    def setUp(self):
+        super(BulkLoadTestCase, self).setUp()
+
+        models.delete_tables()
+        models.create_tables(indexes=False)
+
+    def indexes(self):
+        return [name for (name,) in models.database.execute_sql("SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'")]
+
+    def pragma(self, name):
+        return models.database.execute_sql('PRAGMA %s' % name).fetchone()[0]
+
+    def test_bulk_load(self):
+        # Superseded rows are deleted by ethics id during the load
+        assert self.indexes() == ['expenditure_ethics_id']
+
+        with models.bulk_load():
+            assert self.pragma('synchronous') == 0
+
+            models.Group.create(name='House Republican Caucus', slug='house-republican-caucus')
+
+            with models.QueryLog().capture() as log:
+                models.delete_expenditures('individual', [1])
+
+            assert [models.full_table_scans(sql, params) for sql, params in log.queries if sql.startswith('DELETE')] == [[]]
+
+        assert self.pragma('synchronous') == 2
+        assert self.pragma('journal_mode') == 'delete'
+        assert models.Group.select().count() == 1
+
+        # The same indexes as tables created with them
+        indexes = sorted(self.indexes())
+
+        models.delete_tables()
+        models.create_tables()
+
+        assert indexes == sorted(self.indexes())
+
+class QueryPlanTestCase(DatabaseTestCase):
+    """
+    Test reading query plans.
+    """
+    def scans(self, query):
+        return models.full_table_scans(*query.sql())
+
+    def test_detects_scan(self):
+        query = models.Expenditure.select().where(models.Expenditure.description == 'Lunch')
+
+        assert self.scans(query) == ['expenditure']
+
+class IdentityMapTestCase(DatabaseTestCase):
+    """
+    Test in-memory entity resolution.
+    """
+    def test_get_or_create(self):
+        models.Lobbyist.create(first_name='Jane', last_name='Doe')
+
+        lobbyists = models.IdentityMap(models.Lobbyist, ['first_name', 'last_name'])
+        lobbyists.preload()
+
+        created, jane = lobbyists.get_or_create(first_name='Jane', last_name='Doe')
+        assert not created
+        assert jane.id is not None
+
+        created, john = lobbyists.get_or_create(first_name='John', last_name='Doe')
+        assert created
+        assert john.id is None
+
+        created, again = lobbyists.get_or_create(first_name='John', last_name='Doe')
+        assert again is john
+
+        assert lobbyists.hits == 2
+        assert lobbyists.misses == 1
+
+        assert lobbyists.flush() == 1
+        assert john.id is not None
+        assert models.Lobbyist.get(models.Lobbyist.id == john.id).first_name == 'John'
+
+class ColumnCoercionTestCase(unittest.TestCase):
+    """
+    Test vectorized column conversion.
+    """
+    def test_currency(self):
+        cents, valid = models.coerce_currency([u'$7,083.69 ', u'30.00', u'($12.50)', u'-1', u'', u'n/a'])
+
+        assert cents.tolist() == [708369, 3000, -1250, -100, 0, 0]
+        assert valid.tolist() == [True, True, True, True, False, False]
+
+    def test_dates(self):
+        ordinals, dates = models.coerce_dates([u'4/1/2013', u'Jan-13', u'4/1/2013', u'junk'], models.DateParser())
+
+        assert ordinals.tolist() == [datetime.date(2013, 4, 1).toordinal(), datetime.date(2013, 1, 1).toordinal(), datetime.date(2013, 4, 1).toordinal(), 0]
+        assert dates.tolist() == [datetime.date(2013, 4, 1), datetime.date(2013, 1, 1), datetime.date(2013, 4, 1), None]
+
+class WorkbookTestCase(TempDirTestCase):
+    """
+    Test streaming rows from MEC workbooks.
+    """
+    def test_read_workbook_rows(self):
+        path = os.path.join(self.tmp_path, '2013.xlsx')
+
+        workbook = openpyxl.Workbook()
+        workbook.active.title = '2013 W Amendments Indiv '
+        workbook.create_sheet('2013 W Amendments Group').append(['Grp ID'])
+
+        sheet = workbook['2013 W Amendments Indiv ']
+        sheet.append(['Lob L Name', 'Report', 'Cost', 'Pub Off', 'Indv ID'])
+        sheet.append([' Doe ', datetime.datetime(2013, 4, 1), 21.4, None, 34795])
+        sheet.append([None, None, None, None, None])
+        sheet.append(['Roe', datetime.datetime(2013, 5, 1), 30.0, 'NULL', 34796])
+        workbook.save(path)
+
+        rows = list(models.read_workbook_rows(path, 'individual'))
+
+        assert rows == [
+            { 'Lob L Name': 'Doe', 'Report': '4/1/2013', 'Amount': '21.4', 'Pub Official': '', 'Indiv ID': '34795' },
+            { 'Lob L Name': 'Roe', 'Report': '5/1/2013', 'Amount': '30', 'Pub Official': 'NULL', 'Indiv ID': '34796' }
+        ]
+
+        assert list(models.read_workbook_rows(path, 'group')) == []
+
+class SnapshotCacheTestCase(TempDirTestCase):
+    """
+    Test binary snapshots of parsed files.
+    """
+    def records(self):
+        return [{
+            'line': 1,
+            'messages': [],
+            'valid': True,
+            'ethics_id': 34795,
+            'lobbyist': (u'Melanie', u'Abrajano'),
+            'legislator': u'MARSHALL, NICK',
+            'report_period': datetime.date(2013, 4, 1),
+            'recipient': u'MARSHALL, NICK',
+            'recipient_type': u'Representative',
+            'event_date': datetime.date(2013, 4, 1),
+            'category': u'Meals, Food, & Beverage',
+            'description': u'Lunch at The Caf\xe9',
+            'cost': 21.4,
+            'principal': u'MISSOURI CLUB FOR GROWTH'
+        }, {
+            'line': 2,
+            'messages': [('warn', 'event-date-too-new', u'Skipping, event date too new: 3013-03-27')],
+            'valid': False,
+            'ethics_id': 34796,
+            'lobbyist': (u'Melanie', u'Abrajano'),
+            'group': u'JUDICIARY, Standing'
+        }, {
+            'line': 3,
+            'messages': [],
+            'valid': False,
+            'ethics_id': 34797,
+            'amends': 34790
+        }]
+
+    def test_round_trip(self):
+        records = self.records()
+        snapshots = models.SnapshotCache(self.tmp_path)
+        key = snapshots.key('csv', 2013, 'individual', 'abc')
+        date_window = [datetime.date(2013, 4, 1).toordinal(), datetime.date(3013, 3, 27).toordinal()]
+
+        assert snapshots.load(key, datetime.date(2014, 1, 1)) is None
+
+        snapshots.save(key, records, date_window)
+        snapshot = snapshots.load(key, datetime.date(2014, 1, 1))
+
+        assert list(snapshot.chunks(2)) == [records[:2], records[2:]]
+
+        # Outside the window the "too new" checks could come out differently
+        assert snapshots.load(key, datetime.date(2013, 3, 1)) is None
+
+        # Newer snapshots of the same file replace older ones
+        snapshots.save(snapshots.key('csv', 2013, 'individual', 'def'), records, date_window)
+
+        assert os.listdir(self.tmp_path) == ['csv_2013_individual_def']
+
+    def test_writer(self):
+        records = self.records()
+        snapshots = models.SnapshotCache(self.tmp_path)
+        key = snapshots.key('csv', 2013, 'individual', 'abc')
+
+        # Message indexes carry across chunks
+        writer = snapshots.writer(key)
+        writer.add(records[:1])
+        writer.add(records[1:])
+        writer.save([0, datetime.date.max.toordinal() + 1])
+
+        snapshot = snapshots.load(key, datetime.date(2014, 1, 1))
+
+        assert list(snapshot.chunks(3)) == [records]
+
+class SlugRegistryTestCase(DatabaseTestCase):
+    """
+    Test in-memory slug assignment.
+    """
+    def test_assign(self):
+        models.Organization.create(name='Ameren Missouri', category='Utilities')
+        models.Group.create(name='Pfizer Inc')
+
+        slugs = models.SlugRegistry()
+
+        first = models.Organization(name='Ameren, Missouri', category='')
+        second = models.Organization(name='Ameren Missouri.', category='')
+        pfizer = models.Organization(name='Pfizer Inc', category='')
+
+        assert slugs.assign(first) == 'ameren-missouri-2'
+        assert slugs.assign(second) == 'ameren-missouri-3'
+
+        # Slugs only need to be unique within a model
+        assert slugs.assign(pfizer) == 'pfizer-inc'
+
+class RollupTestCase(DatabaseTestCase):
+    """
+    Test monthly rollups against the expenditures they summarize.
+    """
+    def test_build(self):
+        lobbyist = models.Lobbyist.create(first_name='Jane', last_name='Doe')
+        legislator = models.Legislator.create(first_name='Nick', last_name='Marshall', office='Representative', district='13',
+            party='R', phone='', hometown='', vacant=False, photo_filename='')
+        ameren = models.Organization.create(name='Ameren Missouri', category='Utilities')
+        pfizer = models.Organization.create(name='Pfizer Inc', category='Health')
+
+        create_expenditure(lobbyist, ameren, datetime.date(2012, 12, 1), 10.0, legislator=legislator)
+        create_expenditure(lobbyist, ameren, datetime.date(2013, 1, 1), 20.0, legislator=legislator)
+        create_expenditure(lobbyist, ameren, datetime.date(2013, 1, 1), 5.0)
+        create_expenditure(lobbyist, pfizer, datetime.date(2013, 2, 1), 50.0)
+
+        assert models.build_rollups() == 2 + 3 + 3 + 3
+
+        since = datetime.date(2013, 1, 1)
+
+        assert models.OrganizationMonth.spending() == (85.0, 4)
+        assert models.OrganizationMonth.spending(since, organization=ameren) == (25.0, 2)
+        assert models.LegislatorMonth.spending(since, legislator=legislator) == (20.0, 1)
+        assert models.CategoryMonth.spending(category='Dental') == (0, 0)
+
+        ranked = list(models.OrganizationMonth.ranked(since))
+
+        assert [o.name for o in ranked] == ['Pfizer Inc', 'Ameren Missouri']
+        assert ranked[1].total_spending == 25.0
+        assert ranked[1].total_expenditures == 2
+
+    def test_ranks(self):
+        lobbyist = models.Lobbyist.create(first_name='Jane', last_name='Doe')
+        organizations = [models.Organization.create(name='Organization %i' % i, category='Utilities') for i in range(4)]
+
+        for organization, cost in zip(organizations, [10.0, 30.0, 10.0, 5.0]):
+            create_expenditure(lobbyist, organization, datetime.date(2013, 1, 1), cost)
+
+        models.build_rollups()
+        ranks = models.RankIndex()
+
+        assert [ranks.rank('organization', o) for o in organizations] == [2, 1, 2, 4]
+        assert ranks.rank('category', 'Utilities') == 1
+        assert ranks.rank('legislator', 1) is None
+
+class SelectRelatedTestCase(DatabaseTestCase):
+    """
+    Test reading expenditures with their related rows.
+    """
+    def test_select_related(self):
+        lobbyist = models.Lobbyist.create(first_name='Jane', last_name='Doe')
+        organization = models.Organization.create(name='Ameren Missouri', category='Utilities')
+        caucus = models.Group.create(name='House Republican Caucus')
+
+        for ethics_id, group in enumerate([None, caucus]):
+            create_expenditure(lobbyist, organization, ethics_id=ethics_id, group=group)
+
+        with models.QueryLog().capture() as log:
+            expenditures = list(models.Expenditure.select_related().order_by(models.Expenditure.ethics_id))
+
+            assert [ex.organization.name for ex in expenditures] == ['Ameren Missouri'] * 2
+            assert [ex.lobbyist.last_name for ex in expenditures] == ['Doe'] * 2
+            assert [ex.group and ex.group.name for ex in expenditures] == [None, 'House Republican Caucus']
+            assert [ex.legislator for ex in expenditures] == [None, None]
+
+        assert len(log.queries) == 1
+
+class DatasetTestCase(DatabaseTestCase):
+    """
+    Test recording dataset metadata.
+    """
+    def test_record(self):
+        lobbyist = models.Lobbyist.create(first_name='Jane', last_name='Doe')
+        organization = models.Organization.create(name='Ameren Missouri', category='Utilities')
+
+        expenditure = create_expenditure(lobbyist, organization, datetime.date(2013, 8, 1))
+
+        dataset = models.Dataset.record()
+
+        assert models.Dataset.select().count() == 1
+        assert dataset.latest_report_period == datetime.date(2013, 8, 1)
+        assert dataset.window_start == datetime.date(2011, 9, 1)
+        assert dataset.expenditures == 1
+        assert dataset.lobbyists == 1
+
+        assert models.Dataset.record().version == dataset.version
+
+        expenditure.cost = 20.0
+        expenditure.save()
+
+        assert models.Dataset.record().version != dataset.version
+        assert models.Dataset.select().count() == 1
+
+    def test_window_start(self):
+        assert models.window_start(datetime.date(2013, 8, 1)) == datetime.date(2011, 9, 1)
+        assert models.window_start(datetime.date(2013, 12, 1)) == datetime.date(2011, 12, 1)
+
+class SampleLoadTestCase(DatabaseTestCase):
+    """
+    Base class for tests that run the loader over a small year of data.
+    """
+    INDIVIDUAL_HEADER = 'Lob F Name,Lob L Name,Report,Pub Official,Recipient,Date,Type,Description,Amount,Principal,Amend Reason,Amend Indv ID,If Amended,Indiv ID'
+    GROUP_HEADER = 'Lob F Name,Lob L Name,Report,Group,Date,Type,Description,Amount,Principal,Amend Reason,Amend Grp ID,If Amended,Grp ID'
+    SOLICITATION_HEADER = 'Lob F Name,Lob L Name,Report,Pub Official,Recipient,Date,Type,Description,Amount,Principal,Amend Reason,Amend Sol ID,If Amended,Sol ID'
+
+    def setUp(self):
+        super(SampleLoadTestCase, self).setUp()
+
+        self.lobbying_data_path = models.app_config.LOBBYING_DATA_PATH
+        models.app_config.LOBBYING_DATA_PATH = self.tmp_path
+
+        self.write('organization_name_lookup.csv', [
+            'ethics,correct,category',
+            'AMEREN MISSOURI,Ameren Missouri,Utilities'
+        ])
+        self.write('legislator_demographics.csv', [
+            'first_name,last_name,office,district,party,ethics_name,phone,year_elected,hometown,photo',
+            'Sue,Allen,Representative,1,Republican,"ALLEN, SUE",555,2010,Town,'
+        ])
+
+        # Ethics id 2 spans the boundary between the first two chunks
+        self.write('2013_individual.csv', [
+            self.INDIVIDUAL_HEADER,
+            'Jane,Doe,Mar-13,,"ALLEN, SUE  - Representative",3/27/2013,Meals,Lunch,10.00,AMEREN MISSOURI,,0,Not Amended,1',
+            'Jane,Doe,Mar-13,,"ALLEN, SUE  - Representative",3/27/2013,Meals,Beverages,2.45,AMEREN MISSOURI,,0,Not Amended,2',
+            'Jane,Doe,Mar-13,,"ALLEN, SUE  - Representative",3/27/2013,Meals,Beverages,2.45,AMEREN MISSOURI,,0,Not Amended,2',
+            'Jane,Doe,Mar-13,,"ALLEN, SUE  - Representative",3/27/2013,Meals,Beverages,2.43,AMEREN MISSOURI,,0,Not Amended,2',
+            'Jane,Doe,Apr-13,,"ALLEN, SUE  - Representative",4/2/2013,Meals,Dinner,30.00,AMEREN MISSOURI,,0,Not Amended,3',
+            'Jane,Doe,Apr-13,,"ALLEN, SUE  - Representative",4/3/2013,Meals,Dinner,12.00,UNION ELECTRIC,,0,Not Amended,4'
+        ])
+        self.write('2013_group.csv', [
+            self.GROUP_HEADER,
+            'Jane,Doe,Jan-13,ENTIRE GENERAL ASSEMBLY,1/7/2013,Meals,Reception,500.00,AMEREN MISSOURI,NULL,0,Not Amended,1'
+        ])
+        self.write('2013_solicitation.csv', [
+            self.SOLICITATION_HEADER,
+            'Jane,Doe,Apr-13,,"ALLEN, SUE  - Representative",4/8/2013,Meals,Meal,6.75,AMEREN MISSOURI,,0,Not Amended,1'
+        ])
+
+    def tearDown(self):
+        models.app_config.LOBBYING_DATA_PATH = self.lobbying_data_path
+
+        super(SampleLoadTestCase, self).tearDown()
+
+    def write(self, filename, lines):
+        with open(os.path.join(self.tmp_path, filename), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def load(self, incremental=False, processes=1, snapshots=False):
+        loader = models.LobbyLoader(2013, chunk_size=2, processes=processes, incremental=incremental, snapshots=snapshots)
+        loader.organization_name_lookup_filename = os.path.join(self.tmp_path, 'organization_name_lookup.csv')
+        loader.legislators_demographics_filename = os.path.join(self.tmp_path, 'legislator_demographics.csv')
+        loader.years = lambda: [2013]
+
+        if not loader.check_incremental():
+            models.delete_tables()
+            models.create_tables()
+
+        loader.run()
+
+        return loader
+
+class IncrementalLoadTestCase(SampleLoadTestCase):
+    """
+    Test reloading changed files into an existing database.
+    """
+    def test_incremental_load(self):
+        self.load(incremental=False)
+
+        assert models.Expenditure.select().count() == 7
+        assert models.DataFile.select().count() == 6
+
+        path = os.path.join(self.tmp_path, '2013_individual.csv')
+
+        with open(path) as f:
+            data = f.read()
+
+        self.write('2013_individual.csv', [data.replace('Dinner', 'Supper').strip()])
+
+        loader = self.load(incremental=True)
+
+        assert loader.incremental
+        assert models.Expenditure.select().count() == 7
+        assert models.Expenditure.select().where(models.Expenditure.ethics_id == 2).count() == 3
+        assert models.Expenditure.get(models.Expenditure.ethics_id == 3).description == 'Supper'
+        assert models.DataFile.get(models.DataFile.path == path).checksum == models.file_checksum(path)
+
+        # A full load of the same files gets the same version
+        version = models.Dataset.get().version
+
+        self.load(incremental=False)
+
+        assert models.Dataset.get().version == version
+
+    def test_fallback_records_manifest(self):
+        self.load(incremental=False)
+
+        self.write('organization_name_lookup.csv', [
+            'ethics,correct,category',
+            'AMEREN MISSOURI,Ameren Missouri,Energy'
+        ])
+
+        loader = self.load(incremental=True)
+
+        assert not loader.incremental
+        assert models.Expenditure.select().count() == 7
+        assert models.DataFile.select().count() == 6
+
+class InvalidIdTestCase(SampleLoadTestCase):
+    """
+    Test skipping rows without a usable ethics ID.
+    """
+    def test_blank_ids(self):
+        path = os.path.join(self.tmp_path, '2013_individual.csv')
+
+        with open(path, 'a') as f:
+            f.write('Jane,Doe,Apr-13,,"ALLEN, SUE  - Representative",4/9/2013,Meals,Lunch,8.00,AMEREN MISSOURI,,0,Not Amended,\n')
+            f.write('Jane,Doe,Apr-13,,"ALLEN, SUE  - Representative",4/9/2013,Meals,Lunch,8.00,AMEREN MISSOURI,,,Amended,5\n')
+
+        # The second load reads the parsed rows back from a snapshot
+        for i in range(2):
+            loader = self.load(snapshots=True)
+
+            assert models.Expenditure.select().count() == 7
+            assert loader.diagnostics.summary()['error']['invalid-ethics-id'] == {'2013': 1}
+            assert loader.diagnostics.summary()['error']['invalid-amendment-id'] == {'2013': 1}
+            assert loader.diagnostics.examples[('error', 'invalid-ethics-id')] == ['2013 -- 00007 -- Skipping: invalid ethics ID, ""']
+
+class ParallelLoadTestCase(SampleLoadTestCase):
+    """
+    Test that parsing in a worker pool loads the same data.
+    """
+    def results(self, loader):
+        return (
+            loader.expenditures_written,
+            models.Expenditure.select().count(),
+            loader.diagnostics.summary(),
+            models.Dataset.get().version
+        )
+
+    def test_parallel_load(self):
+        serial = self.results(self.load())
+        parallel = self.results(self.load(processes=2))
+
+        assert serial[1] == 7
+        assert serial[2]['error']['organization-not-in-lookup'] == {'2013': 1}
+        assert parallel == serial
+
+class DiagnosticsTestCase(TempDirTestCase):
+    """
+    Test bounded warning and error logging.
+    """
+    def test_log(self):
+        path = os.path.join(self.tmp_path, 'load.log')
+        diagnostics = models.Diagnostics(path, max_examples=2)
+
+        for i in range(5):
+            diagnostics.log('warn', 'event-date-too-new', 'Too new', 2013, i + 1)
+
+        diagnostics.log('warn', 'event-date-too-new', 'Too new', 2014, 1)
+        diagnostics.log('error', 'negative-cost', u'Negative cost \xe9', 2014, 2)
+        diagnostics.close()
+
+        assert diagnostics.count('warn') == 6
+        assert diagnostics.count('error') == 1
+        assert diagnostics.counts[('warn', 'event-date-too-new')] == {2013: 5, 2014: 1}
+        assert diagnostics.examples[('warn', 'event-date-too-new')] == ['2013 -- 00001 -- Too new', '2013 -- 00002 -- Too new']
+
+        with open(path) as f:
+            lines = f.readlines()
+
+        assert len(lines) == 7
+        assert lines[-1].split(' ', 3)[1:] == ['ERROR', 'negative-cost', '2014 -- 00002 -- Negative cost \xc3\xa9\n']
+
+class StageTimerTestCase(unittest.TestCase):
+    """
+    Test load instrumentation.
+    """
+    def test_stages(self):
+        timer = models.StageTimer()
+
+        with timer.time('parse', 10):
+            sum(range(10000))
+
+        with timer.time('write') as stage:
+            stage.rows = 5
+
+        timer.add('parse', 20, 1.0, 0.5, 10 ** 9)
+
+        parse = timer.get('parse')
+
+        assert [name for name, stage in timer.items()] == ['parse', 'write']
+        assert parse.rows == 30
+        assert parse.seconds >= 1.0
+        assert parse.cpu_seconds >= 0.5
+        assert parse.peak_rss == 10 ** 9
+        assert timer.get('write').as_dict()['rows'] == 5
+        assert timer.get('write').peak_rss > 0
+
+class TrigramIndexTestCase(unittest.TestCase):
+    """
+    Test fuzzy name suggestions.
+    """
+    def test_search(self):
+        index = models.TrigramIndex([
+            'INDEPENDENT COLLEGES & UNIVERSITIES OF MISSOURI',
+            'Independent Colleges & Universities Of Missouri',
+            'UNIVERSITY OF MISSOURI',
+            'AMEREN MISSOURI'
+        ])
+
+        # Case and punctuation variants are indexed once
+        assert len(index) == 3
+
+        results = index.search('Independent Colleges and Universities of Missouri', limit=2)
+
+        assert [name for name, score in results] == ['INDEPENDENT COLLEGES & UNIVERSITIES OF MISSOURI', 'UNIVERSITY OF MISSOURI']
+        assert results[0][1] > 0.9
+
+        assert index.search('Ameren, Missouri.', limit=1) == [('AMEREN MISSOURI', 1.0)]
+        assert index.search('Pfizer Inc') == []
+
+    def test_search_many(self):
+        index = models.TrigramIndex(['AMEREN MISSOURI'])
+
+        results = index.search_many(['Ameren Missouri', 'AMEREN MISSOURI', 'Pfizer Inc'])
+
+        assert results['Ameren Missouri'] == results['AMEREN MISSOURI'] == [('AMEREN MISSOURI', 1.0)]
+        assert results['Pfizer Inc'] == []
+
+class LegislatorIndexTestCase(TempDirTestCase):
+    """
+    Test resolving legislator names from recipient strings.
+    """
+    def test_resolve(self):
+        path = os.path.join(self.tmp_path, 'legislator_aliases.csv')
+
+        with open(path, 'w') as f:
+            f.write('alias,ethics_name\n"CARPENTER, JOHN","CARPENTER, JON"\n')
+
+        index = models.LegislatorIndex()
+        index.load_aliases(path)
+
+        carpenter = models.Legislator(ethics_name='CARPENTER, JON')
+        index.add(carpenter)
+
+        assert index.split(u'CARPENTER, JOHN - Representative') == (u'CARPENTER, JOHN', u'Representative')
+        assert index.split(u'SMITH,  JANE - Employee or Staff') == (u'SMITH,  JANE', u'Employee or Staff')
+        assert index.split(u'SMITH, JANE') is None
+
+        assert index.correct(u'Carpenter ,John') == u'CARPENTER, JON'
+
+        assert index.get(u'Carpenter ,John') is carpenter
+        assert index.get(u'Carpenter ,John') is carpenter
+        assert index.get(u'carpenter, jon.') is carpenter
+        assert index.get(u'SMITH, JANE') is None
+
+        # Counted per lookup, memoized or not
+        assert (index.hits, index.alias_hits, index.misses) == (3, 2, 1)
+
+class AmendmentIndexTestCase(unittest.TestCase):
+    """
+    Test amendment resolution.
+    """
+    def test_amend_before_and_after(self):
+        amendments = models.AmendmentIndex()
+
+        amendments.stage('individual', models.Expenditure(ethics_id=1))
+        amendments.amend('individual', 1, 2)
+        amendments.amend('individual', 3, 4)
+        amendments.stage('individual', models.Expenditure(ethics_id=3))
+        amendments.stage('individual', models.Expenditure(ethics_id=5))
+
+        # Same id, different type
+        amendments.stage('group', models.Expenditure(ethics_id=1))
+
+        assert amendments.removed == 2
+        drained = amendments.drain()
+
+        assert [e.ethics_id for e in drained['individual']] == [5]
+        assert [e.ethics_id for e in drained['group']] == [1]
+
+    def test_amend_after_write(self):
+        amendments = models.AmendmentIndex()
+
+        amendments.stage('group', models.Expenditure(ethics_id=1))
+        amendments.drain()
+        amendments.amend('group', 1, 2)
+
+        assert list(amendments.drain_superseded()) == [('group', set([1]))]
+        assert list(amendments.drain_superseded()) == []
+
+    def test_chains(self):
+        amendments = models.AmendmentIndex()
+
+        amendments.amend('solicitation', 10, 11)
+        amendments.amend('solicitation', 11, 12)
+        amendments.amend('solicitation', 20, 21)
+
+        assert list(amendments.chains('solicitation')) == [(10, [11, 12]), (20, [21])]
+
+class DateParserTestCase(unittest.TestCase):
+    """
+    Test MEC date parsing.
+    """
+    def test_known_formats(self):
+        parse_date = models.DateParser()
+
+        assert parse_date('4/1/2013') == datetime.date(2013, 4, 1)
+        assert parse_date('12/31/2013') == datetime.date(2013, 12, 31)
+        assert parse_date('Jan-13') == datetime.date(2013, 1, 1)
+        assert parse_date('Jan-13') == datetime.date(2013, 1, 1)
+
+        assert parse_date.hits == 1
+        assert parse_date.fallbacks == {}
+
+    def test_fallback(self):
+        parse_date = models.DateParser(cache_size=1)
+
+        assert parse_date('2013-04-01') == datetime.date(2013, 4, 1)
+        assert parse_date('2013-04-02') == datetime.date(2013, 4, 2)
+
+        assert parse_date.fallbacks == {'9-9-9': 2}
+        assert len(parse_date.cache) == 1
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+import BaseHTTPServer
+import cgi
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import scraper
+
+FORM_HTML = '''<html><body>
+<form name="aspnetForm" method="post" action="/Lob_ExpCSV.aspx">
+<select name="ctl00$ContentPlaceHolder$ddYear">
+<option value="2012">2012</option>
+<option value="2013">2013</option>
+</select>
+<select name="ctl00$ContentPlaceHolder$ddExpType">
+<option value="1">Individual</option>
+<option value="2">Group</option>
+<option value="3">Solicitation</option>
+</select>
+<input type="submit" name="ctl00$ContentPlaceHolder$btnExport" value="Export" />
+</form>
+</body></html>'''
+
+class FakeMECHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Imitates the Lob_ExpCSV.aspx export form.
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(FORM_HTML)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        form = cgi.parse_qs(self.rfile.read(length))
+
+        year = form['ctl00$ContentPlaceHolder$ddYear'][0]
+        type_code = form['ctl00$ContentPlaceHolder$ddExpType'][0]
+
+        self.server.exports.append((year, type_code))
+
+        if self.server.failures.get((year, type_code), 0) > 0:
+            self.server.failures[(year, type_code)] -= 1
+            self.send_response(500)
+            self.end_headers()
+
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.end_headers()
+        self.wfile.write('year,type\n%s,%s\n' % (year, type_code))
+
+class ScraperTestCase(unittest.TestCase):
+    """
+    Test downloading against a local stand-in for the MEC site.
+    """
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), FakeMECHandler)
+        self.server.exports = []
+        self.server.failures = {}
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.output_path = tempfile.mkdtemp()
+        self.url = 'http://127.0.0.1:%i/Lob_ExpCSV.aspx' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        shutil.rmtree(self.output_path)
+
+    def make_scraper(self, **kwargs):
+        return scraper.MECScraper(self.output_path, url=self.url, delay=0, backoff=0, **kwargs)
+
+    def test_download(self):
+        results = self.make_scraper().run([2012, 2013])
+
+        assert len(results['downloaded']) == 6
+        assert len(self.server.exports) == 6
+
+        with open(os.path.join(self.output_path, '2013_group.csv')) as f:
+            assert f.read() == 'year,type\n2013,2\n'
+
+        assert os.stat(os.path.join(self.output_path, '2013_group.csv')).st_mode & 0777 == 0644
+
+        # No temporary files left behind
+        assert len(os.listdir(self.output_path)) == 6
+
+    def test_cached(self):
+        self.make_scraper().run([2012])
+        results = self.make_scraper().run([2012])
+
+        assert len(results['cached']) == 3
+        assert len(self.server.exports) == 3
+
+        results = self.make_scraper(refresh=True).run([2012])
+
+        assert len(results['downloaded']) == 3
+        assert len(self.server.exports) == 6
+
+    def test_retry(self):
+        self.server.failures[('2012', '1')] = 2
+
+        results = self.make_scraper(retries=2).run([2012])
+
+        assert len(results['downloaded']) == 3
+        assert self.server.exports.count(('2012', '1')) == 3
+
+    def test_failure(self):
+        self.server.failures[('2012', '3')] = 5
+
+        results = self.make_scraper(retries=1).run([2012])
+
+        assert results['failed'] == [(2012, 'solicitation')]
+        assert not os.path.exists(os.path.join(self.output_path, '2012_solicitation.csv'))
+
+if __name__ == '__main__':
+    unittest.main()